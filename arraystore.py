@@ -0,0 +1,157 @@
+"""
+ModLed array store - the registers in a memory-mapped file
+
+An alternative to the SQLite store (see sqlstore.py). The registers of a unit are kept
+in a fixed-size file with an array of 16-bit registers per register type, which is
+mapped into memory. Reads and writes are plain array indexing, without SQL or
+SQLAlchemy. Writes go to the page cache; they're synced to disk (msync) with sync(),
+which the CachedSlaveContext in front of the store calls once per batch of writes.
+
+A store that doesn't exist yet is migrated from the SQLite database with the same
+name, if there is one.
+"""
+
+import logging
+import mmap
+import os
+
+import numpy as np
+
+from pymodbus.interfaces import IModbusSlaveContext
+
+from configuration import upgrade, LEGACY
+from datastore import TYPE_FUNCTIONS, read_registers as read_sql_registers
+
+logger = logging.getLogger(__name__)
+
+REGISTERS = 256 # per register type
+
+# NOTE: the header holds int64 values: the version of the layout (0 while the store is created) and,
+# for every register type, the number of registers that exist. The arrays of registers follow the header.
+VERSION = 1
+TYPES = list(TYPE_FUNCTIONS)
+HEADER = 1 + len(TYPES)
+
+
+class ModLedArraySlaveContext(IModbusSlaveContext):
+    """
+    The registers of a unit in the file {table}.registers. Like in the SQLite store, only the
+    registers that have been written exist: for every type, the registers from address 0 up
+    to the highest address written.
+    """
+
+    def __init__(self, database='modled', table=None, size=REGISTERS):
+        # NOTE: every unit has its own file, like it has its own table in the SQLite database
+        table = table or database
+        self.path = f"{table}.registers"
+        self.size = size
+
+        length = HEADER * 8 + len(TYPES) * size * 2
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            existing = os.fstat(fd).st_size
+            if existing == 0:
+                os.ftruncate(fd, length)
+            elif existing != length:
+                raise ValueError(f"{self.path} is not a store of {size} registers per type")
+            self._map = mmap.mmap(fd, length)
+        finally:
+            os.close(fd)
+
+        self._header = np.ndarray(HEADER, dtype=np.int64, buffer=self._map)
+        self._registers = np.ndarray((len(TYPES), size), dtype=np.uint16, buffer=self._map, offset=HEADER * 8)
+
+        if self._header[0] == 0:
+            self._migrate(database, table)
+        elif self._header[0] != VERSION:
+            raise ValueError(f"{self.path} has an unknown version: {self._header[0]}")
+
+    def __str__(self):
+        return f"ModLedArraySlaveContext({self.path})"
+
+    def _migrate(self, database, table):
+        """Copy the registers from the SQLite database of a ModLedSqlSlaveContext, if there is one."""
+        migrated = 0
+        for type in TYPES:
+            registers = read_sql_registers(database, table, type)
+            if registers:
+                self._write(type, list(registers), list(registers.values()))
+                migrated += len(registers)
+        if migrated:
+            logger.info(f"Migrated {migrated} registers from {database}.sqlite3 to {self.path}")
+
+        # NOTE: the version is written last; a store that was created halfway is migrated again
+        self._header[0] = VERSION
+        self.sync()
+
+    def initialize(self, hr, force=False):
+        # NOTE: like ModLedSqlSlaveContext.initialize, for Holding Registers only
+        logger.info(f"Initializing {self.path}")
+        count = self._count('h')
+        if count == 0 or force:
+            logger.info(f"Initializing {self.path} with {hr}.")
+            # NOTE: the SqlSlaveContext stores the block at address 1 as index 1, i.e. at address 0
+            self.setValues(TYPE_FUNCTIONS['h'], hr.address - 1, hr.values)
+        elif count < len(hr.values):
+            # NOTE: the registers added in later versions are added to the stores of earlier versions
+            upgrades = upgrade(self.registers('h'))
+            logger.info(f"Extending {self.path} with {len(hr.values) - count} registers.")
+            self.setValues(TYPE_FUNCTIONS['h'], hr.address - 1 + count, hr.values[count:])
+            for address, value in upgrades.items():
+                logger.info(f"Upgrading register {address} from {LEGACY} to {value}.")
+                self.setValues(TYPE_FUNCTIONS['h'], address, [value])
+        else:
+            logger.info(f"{self.path} already contains {count} register addresses.")
+        self.sync()
+
+    def reset(self):
+        self._registers[:] = 0
+        self._header[1:] = 0
+        self.sync()
+
+    def validate(self, fx, address, count=1):
+        return 0 <= address and address + count <= self._count(self.decode(fx))
+
+    def getValues(self, fx, address, count=1):
+        return self._registers[TYPES.index(self.decode(fx)), address:address + count].tolist()
+
+    def setValues(self, fx, address, values):
+        self._write(self.decode(fx), range(address, address + len(values)), values)
+
+    def _write(self, type, addresses, values):
+        index = TYPES.index(type)
+        addresses = np.asarray(addresses, dtype=np.int64)
+        if addresses.min() < 0 or addresses.max() >= self.size:
+            raise IndexError(f"Registers {addresses.min()}-{addresses.max()} are out of the range of {self.path}")
+        self._registers[index, addresses] = values
+        self._header[1 + index] = max(self._header[1 + index], addresses.max() + 1)
+
+    def sync(self):
+        """Sync the registers that were written to disk."""
+        self._map.flush()
+
+    def registers(self, type):
+        """Returns all registers of a type as a dictionary of address to value."""
+        return dict(enumerate(self._registers[TYPES.index(type), :self._count(type)].tolist()))
+
+    def _count(self, type):
+        return int(self._header[1 + TYPES.index(type)])
+
+
+def read_registers(database='modled', table=None, type='h'):
+    """
+    Read the registers of a type straight from the file of a ModLedArraySlaveContext, like
+    datastore.read_registers. Returns a dictionary of address to value, or None when there's
+    no store (yet).
+    """
+    try:
+        with open(f"{table or database}.registers", 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) < HEADER * 8 or np.frombuffer(data, dtype=np.int64, count=1)[0] != VERSION:
+        return None
+    header = np.frombuffer(data, dtype=np.int64, count=HEADER)
+    registers = np.frombuffer(data, dtype=np.uint16, offset=HEADER * 8).reshape(len(TYPES), -1)
+    index = TYPES.index(type)
+    return dict(enumerate(registers[index, :header[1 + index]].tolist())) or None
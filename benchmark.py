@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+"""
+ModLed benchmarks - headless performance measurements
+
+Measures, without a ledstrip attached:
+
+ * programs: the render time per frame and the achievable fps of every program,
+   against a capture-only strip, for several strip lengths;
+ * throughput: the requests per second a locally started server.py handles,
+   for reads (FC3) and writes (FC16);
+ * latency: the time from a Modbus write to the resulting show(), through the
+   complete path of request, signal, coalescer, controller and ledstrip. The show()
+   can't be observed from outside the server, so this runs the Twisted server from
+   server.py in this process, with the show() of the controller instrumented.
+
+The results are written as JSON, such that runs (and releases) can be compared.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from pymodbus.client.sync import ModbusTcpClient
+
+from framebuffer import Framebuffer
+from stream import StreamBuffer, registers_for
+import programs
+
+LENGTHS = [60, 240, 1000]
+FRAMES = 500
+REQUESTS = 2000
+SAMPLES = 50
+PROGRAMS = ['fixed', 'rainbow', 'rainbow_cycle', 'theater_chase', 'theater_chase_rainbow', 'stream']
+
+
+class CaptureLedstrip(Framebuffer):
+    """A ledstrip that captures the shown frames instead of sending them anywhere."""
+
+    def __init__(self, num, brightness=255):
+        super(CaptureLedstrip, self).__init__(num, brightness)
+        self.frame = np.zeros(num, dtype=np.uint32)
+        self.frames = 0
+
+    def show(self):
+        # NOTE: a single copy per frame, comparable to the upload into the ws281x driver
+        np.copyto(self.frame, self.pixels)
+        self.frames += 1
+
+
+def summarize(samples):
+    """Summarize durations in seconds as milliseconds."""
+    samples = np.asarray(samples) * 1000
+    return {
+        'count': len(samples),
+        'mean_ms': float(samples.mean()),
+        'p50_ms': float(np.percentile(samples, 50)),
+        'p95_ms': float(np.percentile(samples, 95)),
+        'max_ms': float(samples.max())
+    }
+
+
+def benchmark_program(program, length, frames=FRAMES):
+    strip = CaptureLedstrip(length)
+    configuration = {'red': 255, 'green': 128, 'blue': 0}
+
+    # NOTE: for the stream program, every frame is written and latched into the stream buffer first
+    stream = StreamBuffer(length)
+    registers = np.random.randint(0, 1 << 16, registers_for(length)).tolist()
+
+    animation = programs.create(program, strip, configuration, stream)
+    durations = []
+    while len(durations) < frames:
+        start = time.perf_counter()
+        if program == 'stream':
+            stream.write(0, registers)
+        animation.render()
+        animation.step += 1
+        strip.show()
+        durations.append(time.perf_counter() - start)
+
+    result = {'program': program, 'length': length, 'render': summarize(durations)}
+    result['fps'] = 1000 / result['render']['mean_ms']
+    return result
+
+
+def benchmark_programs(lengths=LENGTHS, frames=FRAMES, programs=PROGRAMS):
+    return [benchmark_program(program, length, frames) for length in lengths for program in programs]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server at {host}:{port} did not start within {timeout} seconds")
+
+
+def benchmark_throughput(requests=REQUESTS, unit=1):
+    """Requests per second against server.py (on Twisted, like it's run by default), started in a subprocess with the ledstrip disabled."""
+    host, port = '127.0.0.1', free_port()
+    directory = tempfile.mkdtemp(prefix='modled-benchmark-')
+    database = os.path.join(directory, 'modled')
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server.py'),
+         '-H', host, '-P', str(port), '-D', database, '-DL'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_for(host, port)
+        client = ModbusTcpClient(host, port=port)
+        client.connect()
+
+        results = {}
+        for name, request in [
+            ('read_holding_registers', lambda: client.read_holding_registers(1, 8, unit=unit)),
+            ('write_registers', lambda: client.write_registers(2, [10, 20, 30], unit=unit))
+        ]:
+            errors = 0
+            durations = []
+            start = time.perf_counter()
+            for _ in range(requests):
+                before = time.perf_counter()
+                response = request()
+                durations.append(time.perf_counter() - before)
+                if response.isError():
+                    errors += 1
+            elapsed = time.perf_counter() - start
+            results[name] = {
+                'requests': requests,
+                'errors': errors,
+                'requests_per_second': requests / elapsed,
+                'response': summarize(durations)
+            }
+
+        client.close()
+        return results
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def benchmark_latency(samples=SAMPLES, coalesce_window=None, unit=1):
+    """The time from sending a write to the program register until the controller shows the result."""
+    import server
+    import modbus
+    from twisted.internet import reactor
+    from pymodbus.server.asynchronous import StartTcpServer
+
+    host, port = '127.0.0.1', free_port()
+    directory = tempfile.mkdtemp(prefix='modled-benchmark-')
+    window = server.WINDOW if coalesce_window is None else coalesce_window
+
+    units, context = server.create_units([unit], database=os.path.join(directory, 'modled'))
+    modled = units[0]
+    controller = server.ModLedController(configuration=modled.configuration.asDict(), stream=modled.stream, disable_ledstrip=True)
+
+    shown = threading.Event()
+    timestamps = []
+    switches = [controller.switches] # the number of switches before the write
+    show = controller.ledstrip.show
+
+    def instrumented_show():
+        show()
+        # NOTE: the program that runs until the switch keeps showing frames; only the frames after it count
+        if controller.switches > switches[0]:
+            timestamps.append(time.perf_counter())
+            shown.set()
+
+    controller.ledstrip.show = instrumented_show
+    controller.start()
+    modled.connect(controller, coalesce_window=window, call_later=reactor.callLater)
+
+    StartTcpServer(
+        context,
+        identity=modbus.create_identity(),
+        address=(host, port),
+        custom_functions=modbus.CUSTOM_FUNCTIONS,
+        defer_reactor_run=True
+    )
+    reactor_thread = threading.Thread(target=reactor.run, kwargs={'installSignalHandlers': False}, daemon=True)
+    reactor_thread.start()
+
+    try:
+        wait_for(host, port)
+        client = ModbusTcpClient(host, port=port)
+        client.connect()
+
+        latencies = []
+        responses = []
+        for sample in range(samples):
+            # NOTE: alternating between on + fixed and on + rainbow, such that every write switches programs
+            value = 3 if sample % 2 else 5
+            shown.clear()
+            del timestamps[:]
+            switches[0] = controller.switches
+            start = time.perf_counter()
+            response = client.write_register(1, value, unit=unit)
+            responses.append(time.perf_counter() - start)
+            if response.isError() or not shown.wait(5):
+                continue
+            latencies.append(timestamps[0] - start)
+
+        client.close()
+        return {
+            'samples': samples,
+            'coalesce_window_ms': window * 1000,
+            'response': summarize(responses),
+            'write_to_show': summarize(latencies) if latencies else None,
+            'stages': modled.tracer.summary()
+        }
+    finally:
+        reactor.callFromThread(reactor.stop)
+        reactor_thread.join(10)
+        modled.close()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def environment():
+    try:
+        revision = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'revision': revision,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine()
+    }
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='ModLed X Benchmarks.')
+    parser.add_argument('-L', '--lengths', nargs='+', type=int, default=LENGTHS, help='The strip lengths to render the programs for')
+    parser.add_argument('-F', '--frames', type=int, default=FRAMES, help='The number of frames to render per program and length')
+    parser.add_argument('-N', '--requests', type=int, default=REQUESTS, help='The number of requests per request type for the throughput')
+    parser.add_argument('-S', '--samples', type=int, default=SAMPLES, help='The number of writes for the write to show latency')
+    parser.add_argument('-C', '--coalesce-window', type=float, default=None, help='The coalesce window (in seconds) for the latency; defaults to that of the server')
+    parser.add_argument('--skip-programs', action='store_true', help='Skip rendering the programs')
+    parser.add_argument('--skip-modbus', action='store_true', help='Skip the Modbus throughput and latency')
+    parser.add_argument('-o', '--output', type=str, default=None, help='The file to write the results to; defaults to stdout')
+
+    args = parser.parse_args()
+
+    results = {'environment': environment()}
+    if not args.skip_programs:
+        results['programs'] = benchmark_programs(lengths=args.lengths, frames=args.frames)
+    if not args.skip_modbus:
+        results['throughput'] = benchmark_throughput(requests=args.requests)
+        results['latency'] = benchmark_latency(samples=args.samples, coalesce_window=args.coalesce_window)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
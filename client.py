@@ -1,7 +1,13 @@
 #!/usr/bin/env python
 
 import argparse
+import concurrent.futures
+import json
 import logging
+import random
+import sys
+import threading
+import time
 
 from pymodbus.client.sync import ModbusTcpClient
 
@@ -35,23 +41,293 @@ def main(host, port, address, write=None, unit=1): # NOTE: the unit is like an i
     client.close()
 
 
+# NOTE: the requests the load generator replays, against the ModLed register map. Writes only touch the
+# color registers (40002-40004), such that the program that's running is not switched by the load itself.
+REQUESTS = {
+    3: lambda client, unit: client.read_holding_registers(1, 8, unit=unit),
+    6: lambda client, unit: client.write_register(2 + random.randrange(3), random.randrange(256), unit=unit),
+    16: lambda client, unit: client.write_registers(2, [random.randrange(256) for _ in range(3)], unit=unit)
+}
+MIX = '3:70,6:20,16:10'
+
+ADDRESS_MISSED = 3 # NOTE: the input registers with the missed frame deadlines of the server; see metrics.py
+
+
+def parse_mix(mix):
+    """Parse a mix like 3:70,6:20,16:10 into a dictionary of function code to weight."""
+    weights = {}
+    for part in mix.split(','):
+        function_code, weight = part.split(':')
+        if int(function_code) not in REQUESTS:
+            raise ValueError(f"Function code {function_code} is not supported; use one of {sorted(REQUESTS)}")
+        weights[int(function_code)] = float(weight)
+    return weights
+
+
+def percentile(values, p):
+    """The p-th percentile of sorted values."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def missed_deadlines(host, port, unit):
+    """The number of frame deadlines the server missed so far, or None when it doesn't publish metrics."""
+    client = ModbusTcpClient(host, port=port)
+    try:
+        client.connect()
+        rr = client.read_input_registers(ADDRESS_MISSED, 2, unit=unit)
+        if rr.isError():
+            return None
+        return rr.registers[0] << 16 | rr.registers[1]
+    except Exception:
+        return None
+    finally:
+        client.close()
+
+
+def load(host, port, unit=1, connections=10, rate=100.0, duration=10.0, mix=MIX):
+    """
+    Replay a mix of requests from a number of concurrent connections at a target rate (requests
+    per second, over all connections) for duration seconds. Every connection sends its requests
+    on a fixed schedule, regardless of how long the responses take, so a slow server shows up as
+    a lower throughput and a higher latency instead of being hidden by the clients waiting on it.
+    """
+    weights = parse_mix(mix)
+    function_codes = list(weights)
+    interval = connections / rate
+
+    lock = threading.Lock()
+    latencies = {function_code: [] for function_code in function_codes}
+    errors = {function_code: 0 for function_code in function_codes}
+    late = [0]
+
+    missed_before = missed_deadlines(host, port, unit)
+
+    def worker(index):
+        client = ModbusTcpClient(host, port=port)
+        client.connect()
+        # NOTE: the connections are spread out evenly over the interval
+        scheduled = start + index * interval / connections
+        while scheduled < start + duration:
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -interval:
+                with lock:
+                    late[0] += 1
+
+            function_code = random.choices(function_codes, [weights[fc] for fc in function_codes])[0]
+            before = time.perf_counter()
+            try:
+                response = REQUESTS[function_code](client, unit)
+                failed = response.isError()
+            except Exception as e:
+                logger.debug(f"Request failed: {e}")
+                failed = True
+            latency = time.perf_counter() - before
+
+            with lock:
+                if failed:
+                    errors[function_code] += 1
+                else:
+                    latencies[function_code].append(latency)
+
+            scheduled += interval
+        client.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(index,), daemon=True) for index in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    missed_after = missed_deadlines(host, port, unit)
+
+    def summary(values, failed):
+        values = sorted(values)
+        return {
+            'requests': len(values) + failed,
+            'errors': failed,
+            'p50_ms': percentile(values, 50) * 1000 if values else None,
+            'p95_ms': percentile(values, 95) * 1000 if values else None,
+            'p99_ms': percentile(values, 99) * 1000 if values else None,
+            'max_ms': values[-1] * 1000 if values else None
+        }
+
+    everything = [latency for values in latencies.values() for latency in values]
+    total = summary(everything, sum(errors.values()))
+    return {
+        'connections': connections,
+        'target_rate': rate,
+        'duration': elapsed,
+        'throughput': total['requests'] / elapsed,
+        'late': late[0],
+        'total': total,
+        'function_codes': {function_code: summary(latencies[function_code], errors[function_code]) for function_code in function_codes},
+        'missed_deadlines': missed_after - missed_before if None not in (missed_before, missed_after) else None
+    }
+
+
+# NOTE: the maximum number of registers in a single FC3 read and FC16 write
+MAX_READ = 125
+MAX_WRITE = 123
+
+
+def parse_operation(operation):
+    """
+    Parse an operation: ADDRESS reads a register, FIRST-LAST reads a range of registers and
+    ADDRESS=VALUE[,VALUE...] writes one or more values from the address onwards.
+    Returns ('read', address, count) or ('write', address, values).
+    """
+    if '=' in operation:
+        address, values = operation.split('=', 1)
+        return ('write', int(address), [int(value) for value in values.split(',')])
+    if '-' in operation:
+        first, last = operation.split('-', 1)
+        if int(last) < int(first):
+            raise ValueError(f"Invalid range: {operation}")
+        return ('read', int(first), int(last) - int(first) + 1)
+    return ('read', int(operation), 1)
+
+
+def read_operations(lines):
+    """Parse the operations in lines of text; operations are separated by whitespace, # starts a comment."""
+    operations = []
+    for line in lines:
+        for operation in line.split('#', 1)[0].split():
+            operations.append(parse_operation(operation))
+    return operations
+
+
+def merge(operations):
+    """
+    Merge consecutive operations on contiguous addresses into range operations: writes into
+    a single FC16 write, reads into a single FC3 read. The order of the operations is kept,
+    so a read after a write still reads the written value.
+    """
+    merged = []
+    for kind, address, payload in operations:
+        if merged and merged[-1][0] == kind:
+            _, last_address, last_payload = merged[-1]
+            if kind == 'write':
+                if address == last_address + len(last_payload) and len(last_payload) + len(payload) <= MAX_WRITE:
+                    merged[-1] = ('write', last_address, last_payload + payload)
+                    continue
+            else:
+                # NOTE: only ranges that continue the previous one; overlapping reads would print a register once
+                # instead of as often as it was asked for, and reading registers in between could fail
+                if address == last_address + last_payload and last_payload + payload <= MAX_READ:
+                    merged[-1] = ('read', last_address, last_payload + payload)
+                    continue
+        merged.append((kind, address, payload))
+    return merged
+
+
+def parse_host(host, port):
+    """Split host[:port] into the host and the port."""
+    if ':' in host:
+        host, port = host.rsplit(':', 1)
+    return host, int(port)
+
+
+def batch(host, port, operations, unit=1):
+    """Run the operations over a single connection. Returns the values read, as (address, value) pairs."""
+    client = ModbusTcpClient(host, port=port)
+    if not client.connect():
+        raise ConnectionError(f"Could not connect to {host}:{port}")
+
+    values = []
+    try:
+        for kind, address, payload in merge(operations):
+            if kind == 'write':
+                if len(payload) == 1:
+                    rq = client.write_register(address, payload[0], unit=unit)
+                else:
+                    rq = client.write_registers(address, payload, unit=unit)
+                if rq.isError():
+                    raise IOError(f"Writing {payload} at {address} failed: {rq}")
+            else:
+                rr = client.read_holding_registers(address, payload, unit=unit)
+                if rr.isError():
+                    raise IOError(f"Reading {payload} registers at {address} failed: {rr}")
+                values.extend(zip(range(address, address + payload), rr.registers))
+    finally:
+        client.close()
+
+    return values
+
+
+def fan_out(hosts, port, operations, unit=1, parallel=16):
+    """Run the operations against all hosts, parallel at a time. Returns a dictionary of host to values or exception."""
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(parallel, len(hosts)))) as executor:
+        futures = {executor.submit(batch, *parse_host(host, port), operations, unit): host for host in hosts}
+        for future in concurrent.futures.as_completed(futures):
+            host = futures[future]
+            try:
+                results[host] = future.result()
+            except Exception as e:
+                results[host] = e
+    return results
+
+
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description='ModLed X Client.')
-    parser.add_argument('-H', '--host', nargs='?', type=str, default='127.0.0.1', help='The Modbus server host (hostname / IP) to connect to')
+    parser.add_argument('-H', '--host', action='append', type=str, default=None, help='The Modbus server host (hostname / IP, optionally with :port) to connect to; repeat for multiple hosts')
     parser.add_argument('-P', '--port', nargs='?', type=int, default=502, help='The Modbus server port number to connect to')
     parser.add_argument('-W', '--write', nargs='?', type=int, default=None, help='Enable writing to the address, otherwise it will be read')
     parser.add_argument('-A', '--address', type=int, default=1, help='The address to read from / write to (in case -W was given)')
     parser.add_argument('-U', '--unit', type=int, default=1, help='The unit (slave identifier) to use')
+    parser.add_argument('-L', '--load', action='store_true', help='Generate load instead of a single read / write')
+    parser.add_argument('-C', '--connections', type=int, default=10, help='The number of concurrent connections for generating load')
+    parser.add_argument('-R', '--rate', type=float, default=100.0, help='The target rate (requests per second, over all connections) for generating load')
+    parser.add_argument('-T', '--duration', type=float, default=10.0, help='The number of seconds to generate load for')
+    parser.add_argument('-f', '--file', type=str, default=None, help='Read operations from a file (- for stdin)')
+    parser.add_argument('-p', '--parallel', type=int, default=16, help='The number of hosts to run the operations against at the same time')
+    parser.add_argument('operations', nargs='*', help='Operations to run over a single connection: ADDRESS (read), FIRST-LAST (read a range) or ADDRESS=VALUE[,VALUE...] (write)')
+    parser.add_argument('-M', '--mix', type=str, default=MIX, help='The mix of function codes and their weights, e.g. 3:70,6:20,16:10')
 
     args = parser.parse_args()
 
-    print(args)
+    logger.debug(args)
 
-    host = args.host
+    hosts = args.host or ['127.0.0.1']
+    host = hosts[0]
     port = args.port
     address = args.address
     write = args.write
     unit = args.unit
 
-    main(host, port, address, write, unit)
+    operations = read_operations(args.operations)
+    if args.file == '-':
+        operations += read_operations(sys.stdin)
+    elif args.file:
+        with open(args.file) as f:
+            operations += read_operations(f)
+
+    if args.load:
+        logger.setLevel(logging.INFO)
+        result = load(*parse_host(host, port), unit, connections=args.connections, rate=args.rate, duration=args.duration, mix=args.mix)
+        print(json.dumps(result, indent=2))
+    elif operations or len(hosts) > 1:
+        # NOTE: a batch runs over a single connection per host; hosts are handled in parallel
+        logger.setLevel(logging.INFO)
+        if not operations:
+            operations = [parse_operation(str(address) if write is None else f"{address}={write}")]
+        results = fan_out(hosts, port, operations, unit, parallel=args.parallel)
+        failed = 0
+        for host in hosts:
+            result = results[host]
+            if isinstance(result, Exception):
+                failed += 1
+                logger.error(f"{host}: {result}")
+                continue
+            for register, value in result:
+                print(f"{host} {register} {value}" if len(hosts) > 1 else f"{register} {value}")
+        sys.exit(1 if failed else 0)
+    else:
+        main(*parse_host(host, port), address, write, unit)
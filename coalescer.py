@@ -0,0 +1,101 @@
+"""
+WriteCoalescer - collapsing bursts of Modbus writes into a single update
+
+SCADA systems tend to write a color and a program as separate requests in quick
+succession. Instead of reconfiguring (and restarting) the ledstrip for every
+single one of them, the writes arriving within a short window are collected and
+applied together.
+"""
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+WINDOW = 0.05 # seconds
+
+
+def _timer(delay, function):
+    timer = threading.Timer(delay, function)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+class WriteCoalescer(object):
+    """
+    Collects writes for window seconds after the first one and then calls apply once
+    with the list of (address, values) writes, in the order they were received.
+    The window is not extended by later writes, so a write is never delayed by more
+    than window seconds. With a window of 0, every write is applied immediately.
+
+    call_later(delay, function) schedules the flush; it defaults to a threading.Timer,
+    but e.g. reactor.callLater will run the flush on the Twisted reactor instead.
+    """
+
+    def __init__(self, apply, window=WINDOW, call_later=_timer):
+        self._apply = apply
+        self._window = window
+        self._call_later = call_later
+
+        self._lock = threading.Lock()
+        self._writes = []
+        self._scheduled = None
+
+        self.writes = 0     # writes received
+        self.batches = 0    # updates applied
+        self.merged = 0     # writes that were merged into another update
+
+    def add(self, address, values):
+        with self._lock:
+            self._writes.append((address, list(values)))
+            self.writes += 1
+            schedule = self._window > 0 and self._scheduled is None
+            if schedule:
+                # NOTE: a placeholder, such that concurrent writes don't schedule another flush
+                self._scheduled = True
+
+        if self._window <= 0:
+            self.flush()
+        elif schedule:
+            scheduled = self._call_later(self._window, self.flush)
+            with self._lock:
+                # NOTE: unless the flush has happened already
+                if self._scheduled is True:
+                    self._scheduled = scheduled
+
+    def flush(self):
+        with self._lock:
+            writes = self._writes
+            self._writes = []
+            self._scheduled = None
+
+        if not writes:
+            return
+
+        self.batches += 1
+        self.merged += len(writes) - 1
+        if len(writes) > 1:
+            logger.debug(f"Merged {len(writes)} writes into a single update")
+
+        self._apply(writes)
+
+    def cancel(self):
+        """Cancel a scheduled flush; pending writes are dropped."""
+        with self._lock:
+            scheduled = self._scheduled
+            self._writes = []
+            self._scheduled = None
+        if scheduled not in (None, True):
+            scheduled.cancel()
+
+    def queued(self):
+        """The number of writes waiting to be applied."""
+        return len(self._writes)
+
+    def statistics(self):
+        return {
+            'writes': self.writes,
+            'batches': self.batches,
+            'merged': self.merged
+        }
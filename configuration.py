@@ -0,0 +1,188 @@
+"""
+ModLed configuration - the holding registers, decoded
+
+The holding registers are decoded into a ModLedConfiguration once at startup.
+After that, writes are applied incrementally: only the fields covered by the
+written address range are decoded again.
+"""
+
+# NOTE: the addresses of the holding registers as used in the Modbus requests, i.e. 40001 is address 1
+ADDRESS_PROGRAM = 1 # bit 0: on/off, bit 1: fixed color, bit 2: rainbow, bit 3: strand test, bit 4: stream
+ADDRESS_RED = 2
+ADDRESS_GREEN = 3
+ADDRESS_BLUE = 4
+ADDRESS_NUMBER_OF_LEDS = 5 # only used at the start of ledstrip initialization
+ADDRESS_BRIGHTNESS = 6 # only used at the start of ledstrip initialization
+ADDRESS_PIN = 7 # only used at the start of ledstrip initialization
+ADDRESS_STREAM_COMMIT = 8 # writing any value latches the streamed pixels
+ADDRESS_TRANSITION = 9 # the duration of the crossfade between programs, in milliseconds; 0 switches at once
+ADDRESS_GAMMA = 10 # the gamma correction, times 100; 100 (or 0) is linear
+ADDRESS_BALANCE_RED = 11 # the color balance: the level (0-255) that full red is shown at
+ADDRESS_BALANCE_GREEN = 12
+ADDRESS_BALANCE_BLUE = 13
+
+# NOTE: the pixels for the stream program; see stream.py for the layout. These registers are
+# kept in memory only and are never written to the database.
+ADDRESS_STREAM = 256
+
+ADDRESS = 0
+COUNT = 14
+
+# NOTE: the values of the registers of a new database, and of the registers that did not exist in earlier versions
+# for databases created by those versions. The other registers start at 17.
+DEFAULTS = {
+    ADDRESS_PROGRAM: 0b11, # on, fixed color
+    ADDRESS_TRANSITION: 0,
+    ADDRESS_GAMMA: 100,
+    ADDRESS_BALANCE_RED: 255,
+    ADDRESS_BALANCE_GREEN: 255,
+    ADDRESS_BALANCE_BLUE: 255
+}
+
+FIELDS = {
+    ADDRESS_RED: 'red',
+    ADDRESS_GREEN: 'green',
+    ADDRESS_BLUE: 'blue',
+    ADDRESS_NUMBER_OF_LEDS: 'number_of_leds',
+    ADDRESS_BRIGHTNESS: 'brightness',
+    ADDRESS_PIN: 'pin',
+    ADDRESS_TRANSITION: 'transition',
+    ADDRESS_GAMMA: 'gamma',
+    ADDRESS_BALANCE_RED: 'balance_red',
+    ADDRESS_BALANCE_GREEN: 'balance_green',
+    ADDRESS_BALANCE_BLUE: 'balance_blue'
+}
+
+# NOTE: the first versions filled every register of a new database with 17. In some of those registers,
+# 17 means something else by now (in the program register, 17 is on + stream); they're upgraded to the defaults.
+LEGACY = 17
+UPGRADES = (ADDRESS_PROGRAM, ADDRESS_TRANSITION)
+
+# NOTE: the fields of the color correction, which is applied to the frames when they're shown
+CORRECTION = ('gamma', 'balance_red', 'balance_green', 'balance_blue')
+
+
+def decode_program(value):
+    """Decode the program register into whether the ledstrip is on and the program to run."""
+    on = (value & 1 << 0 != 0) # zero'th bit
+    fixed = (value & 1 << 1 != 0) # first bit set
+    rainbow = (value & 1 << 2 != 0) # second bit set
+    strand_test = (value & 1 << 3 != 0) # third bit set
+    stream = (value & 1 << 4 != 0) # fourth bit set
+
+    # TODO: programs to add: theaterChase, theaterChaseRainbow, rainbowCycle?
+    rainbow_cycle = False
+    theater_chase = False
+    theater_chase_rainbow = False
+
+    program = None
+    if fixed:
+        program = 'fixed'
+    if rainbow:
+        program = 'rainbow'
+    if strand_test:
+        program = 'strand_test'
+    if rainbow_cycle:
+        program = 'rainbow_cycle'
+    if theater_chase:
+        program = 'theater_chase'
+    if theater_chase_rainbow:
+        program = 'theater_chase_rainbow'
+    if stream:
+        program = 'stream'
+    if not program:
+        program = 'fixed' # TODO: decide whether we should go off instead in case no program determined?
+
+    return on, program
+
+
+def upgrade(registers):
+    """
+    The registers to change in the holding registers of a database created by an earlier version
+    (with fewer than COUNT registers), given as a dictionary of address to value: the registers
+    that still hold the value they were filled with by the first versions, with their defaults.
+    """
+    if len(registers) >= COUNT:
+        return {}
+    return {address: DEFAULTS[address] for address in UPGRADES if registers.get(address) == LEGACY}
+
+
+class ModLedConfiguration(object):
+    """The configuration of a ledstrip, decoded from its holding registers."""
+
+    def __init__(self):
+        self.on = False
+        self.program = 'fixed'
+        self.red = 0
+        self.green = 0
+        self.blue = 0
+        self.number_of_leds = 0
+        self.brightness = 0
+        self.pin = 0
+        self.transition = 0
+        self.gamma = DEFAULTS[ADDRESS_GAMMA]
+        self.balance_red = DEFAULTS[ADDRESS_BALANCE_RED]
+        self.balance_green = DEFAULTS[ADDRESS_BALANCE_GREEN]
+        self.balance_blue = DEFAULTS[ADDRESS_BALANCE_BLUE]
+
+    @classmethod
+    def fromStore(cls, store):
+        """Decode the configuration from the holding registers in a slave context."""
+        configuration = cls()
+        configuration.update(ADDRESS, store.getValues(3, ADDRESS, COUNT)) # read holding registers
+        return configuration
+
+    @classmethod
+    def fromRegisters(cls, registers):
+        """Decode the configuration from a dictionary of holding register address to value (see datastore.read_registers)."""
+        configuration = cls()
+        # NOTE: the registers of an earlier version are upgraded when the store is opened, which may not have happened yet
+        registers = {**registers, **upgrade(registers)}
+        configuration.update(ADDRESS, [registers.get(address, DEFAULTS.get(address, 0)) for address in range(ADDRESS, ADDRESS + COUNT)])
+        return configuration
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __repr__(self):
+        return repr(self.asDict())
+
+    def update(self, address, values):
+        """
+        Apply values written from address onwards. Only the fields covered by the
+        written range are decoded. Returns the names of the fields that changed.
+        """
+        changed = set()
+        for offset, value in enumerate(values):
+            current = address + offset
+            if current == ADDRESS_PROGRAM:
+                on, program = decode_program(value)
+                if on != self.on:
+                    self.on = on
+                    changed.add('on')
+                if program != self.program:
+                    self.program = program
+                    changed.add('program')
+            elif current in FIELDS:
+                field = FIELDS[current]
+                if getattr(self, field) != value:
+                    setattr(self, field, value)
+                    changed.add(field)
+        return changed
+
+    def asDict(self):
+        return {
+            'on': self.on,
+            'red': self.red,
+            'green': self.green,
+            'blue': self.blue,
+            'number_of_leds': self.number_of_leds,
+            'brightness': self.brightness,
+            'pin': self.pin,
+            'transition': self.transition,
+            'gamma': self.gamma,
+            'balance_red': self.balance_red,
+            'balance_green': self.balance_green,
+            'balance_blue': self.balance_blue,
+            'program': self.program
+        }
@@ -0,0 +1,182 @@
+"""
+ModLed datastores - register storage for the Modbus server
+
+The registers are stored in SQLite (see sqlstore.py) or in a memory-mapped file (see arraystore.py),
+behind a write-back cache.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+
+from pymodbus.interfaces import IModbusSlaveContext
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 1.0 # seconds
+
+# NOTE: the function codes we use to read / write the different register types in the underlying store
+TYPE_FUNCTIONS = {'d': 2, 'c': 1, 'h': 3, 'i': 4}
+
+
+class CachedSlaveContext(IModbusSlaveContext):
+    """
+    A write-back cache in front of a slower slave context, like the ModLedSqlSlaveContext.
+
+    All registers of the store are loaded into memory once. Reads are served from memory and
+    writes are applied in memory immediately. A background thread writes the changed registers
+    to the store in batches every flush_interval seconds and when the context is closed, so at
+    most flush_interval seconds of writes can be lost in case of a crash.
+
+    Registers in volatile blocks (see addVolatile) exist in memory only; they start out as 0
+    and are never written to the store.
+    """
+
+    def __init__(self, store, flush_interval=FLUSH_INTERVAL):
+        self._store = store
+        self._flush_interval = flush_interval
+        self._volatile = {}
+
+        self._lock = threading.Lock()
+        self._registers = {}
+        self._pending = {}
+        self.load()
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        self.histogram = None # NOTE: optionally, e.g. an exporter.Histogram of the time spent per flush
+
+    def __str__(self):
+        return f"Cached {self._store}"
+
+    def load(self):
+        """(Re)load all registers from the store; pending writes are discarded."""
+        with self._lock:
+            self._registers = {type: self._store.registers(type) for type in TYPE_FUNCTIONS}
+            self._pending = {type: {} for type in TYPE_FUNCTIONS}
+            for type, (address, count) in self._volatile.items():
+                self._registers[type].update(dict.fromkeys(range(address, address + count), 0))
+
+    def addVolatile(self, type, address, count):
+        """Add a block of count registers at address that is kept in memory only."""
+        with self._lock:
+            self._volatile[type] = (address, count)
+            self._registers[type].update(dict.fromkeys(range(address, address + count), 0))
+
+    def reset(self):
+        self._store.reset()
+        self.load()
+
+    def validate(self, fx, address, count=1):
+        registers = self._registers[self.decode(fx)]
+        return all(a in registers for a in range(address, address + count))
+
+    def getValues(self, fx, address, count=1):
+        registers = self._registers[self.decode(fx)]
+        return [registers[a] for a in range(address, address + count)]
+
+    def setValues(self, fx, address, values):
+        type = self.decode(fx)
+        with self._lock:
+            registers = self._registers[type]
+            if self._isVolatile(type, address):
+                registers.update(zip(range(address, address + len(values)), values))
+                return
+            pending = self._pending[type]
+            for offset, value in enumerate(values):
+                registers[address + offset] = value
+                pending[address + offset] = value
+
+    def _isVolatile(self, type, address):
+        # NOTE: writes can't span volatile and persistent registers, because the addresses in between don't exist
+        if type not in self._volatile:
+            return False
+        start, count = self._volatile[type]
+        return start <= address < start + count
+
+    def pending(self):
+        """The number of registers that have not been written to the store yet."""
+        return sum(len(p) for p in self._pending.values())
+
+    def flush(self):
+        """Write all pending registers to the store, in runs of consecutive addresses, and sync the store."""
+        with self._lock:
+            pending = self._pending
+            self._pending = {type: {} for type in TYPE_FUNCTIONS}
+
+        started = time.perf_counter()
+        for type, registers in pending.items():
+            for address, values in _runs(registers):
+                try:
+                    self._store.setValues(TYPE_FUNCTIONS[type], address, values)
+                except Exception as e:
+                    logger.error(f"Flushing {len(values)} {type} registers at {address} failed: {e}")
+                    # NOTE: keep them for the next flush, unless they've been written again in the mean time
+                    with self._lock:
+                        for offset, value in enumerate(values):
+                            self._pending[type].setdefault(address + offset, value)
+
+        if any(pending.values()):
+            # NOTE: a store that buffers its writes (like the ModLedArraySlaveContext) syncs them once per batch
+            try:
+                self._store.sync()
+            except Exception as e:
+                logger.error(f"Syncing {self._store} failed: {e}")
+
+        if self.histogram and any(pending.values()):
+            self.histogram.observe(time.perf_counter() - started)
+
+    def start(self):
+        """Start flushing in the background."""
+        self._thread = threading.Thread(target=self._run, name='RegisterFlusher', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stop flushing in the background and write whatever is still pending."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stop_event.wait(self._flush_interval):
+            if self.pending():
+                self.flush()
+
+
+def read_registers(database='modled', table=None, type='h'):
+    """
+    Read the registers of a type straight from the SQLite database of a ModLedSqlSlaveContext,
+    with the sqlite3 module instead of SQLAlchemy. Returns a dictionary of address to value, or
+    None when there's no database (yet). This is cheap enough to do before anything else at startup.
+    """
+    table = table or database
+    try:
+        connection = sqlite3.connect(f"file:{database}.sqlite3?mode=ro", uri=True)
+    except sqlite3.Error:
+        return None
+    try:
+        rows = connection.execute(f'SELECT "index", value FROM "{table}" WHERE type = ?', (type,)).fetchall()
+    except sqlite3.Error:
+        return None
+    finally:
+        connection.close()
+    # NOTE: like in ModLedSqlSlaveContext.registers, the indexes are one higher than the addresses
+    return {index - 1: value for index, value in rows} or None
+
+
+def _runs(registers):
+    """Group a dictionary of address to value into (address, values) runs of consecutive addresses."""
+    start, values = None, []
+    for address in sorted(registers):
+        if values and address != start + len(values):
+            yield start, values
+            start, values = None, []
+        if start is None:
+            start = address
+        values.append(registers[address])
+    if values:
+        yield start, values
@@ -0,0 +1,159 @@
+"""
+ModLed exporter - metrics and introspection over HTTP
+
+An optional HTTP listener on the Twisted reactor of the server, serving:
+
+ * /metrics: counters, gauges and histograms in the Prometheus text format
+ * /configuration: the current decoded configuration of every unit, as JSON
+
+The metrics are collected from the units when they are scraped. The render threads
+only ever increment counters and histograms without taking any locks, so a scrape
+never blocks rendering. In return, a scrape may see a histogram halfway an update.
+"""
+
+import bisect
+import json
+
+# NOTE: the buckets (in seconds) for the histograms of the different latencies
+RENDER_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.02, 0.05)
+REQUEST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1)
+FLUSH_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+SIGNAL_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.01)
+
+
+class Histogram(object):
+    """A cumulative histogram, like a Prometheus histogram."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self._counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """The (le, count) pairs of the buckets, including +Inf."""
+        counts = list(self._counts)
+        total = 0
+        result = []
+        for le, count in zip(self.buckets + (float('inf'),), counts):
+            total += count
+            result.append((le, total))
+        return result
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels.items()) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Exposition(object):
+    """Builds a scrape in the Prometheus text format."""
+
+    def __init__(self):
+        # NOTE: the samples of a metric have to be grouped together, so the lines are kept per metric
+        self._families = {}
+
+    def declare(self, name, type, help):
+        if name not in self._families:
+            self._families[name] = [f"# HELP {name} {help}", f"# TYPE {name} {type}"]
+        return self._families[name]
+
+    def sample(self, name, value, type='gauge', help='', **labels):
+        lines = self.declare(name, type, help)
+        lines.append(f"{name}{_labels(labels)} {_number(value)}")
+
+    def histogram(self, name, histogram, help='', **labels):
+        lines = self.declare(name, 'histogram', help)
+        for le, count in histogram.cumulative():
+            lines.append(f"{name}_bucket{_labels(dict(labels, le=_number(le)))} {count}")
+        lines.append(f"{name}_sum{_labels(labels)} {_number(histogram.sum)}")
+        lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+
+    def text(self):
+        return ''.join(line + '\n' for lines in self._families.values() for line in lines)
+
+
+def exposition(units, requests, signals):
+    """The metrics of the units, the Modbus requests (a histogram per function code) and the signal dispatch."""
+    e = Exposition()
+
+    for unit in units:
+        labels = {'unit': unit.unit}
+        controller = unit.controller
+        statistics = controller.getStatistics()
+
+        e.sample('modled_frames_total', statistics['frames'], 'counter', 'Frames shown', **labels)
+        e.sample('modled_missed_deadlines_total', statistics['missed'], 'counter', 'Frame deadlines missed', **labels)
+        e.sample('modled_dropped_frames_total', statistics['dropped'], 'counter', 'Frames skipped to make up for missed deadlines', **labels)
+        e.sample('modled_busy_seconds_total', statistics['busy'], 'counter', 'Time spent rendering and showing frames', **labels)
+        e.sample('modled_switches_total', controller.switches, 'counter', 'Program switches', **labels)
+        if unit.metrics and unit.metrics.latest:
+            e.sample('modled_fps', unit.metrics.latest['fps'], 'gauge', 'Frames shown per second', **labels)
+        if controller.histogram:
+            e.histogram('modled_render_seconds', controller.histogram, 'Time spent rendering and showing a frame', **labels)
+
+        coalescer = unit.coalescer.statistics()
+        e.sample('modled_writes_total', coalescer['writes'], 'counter', 'Writes to the configuration registers', **labels)
+        e.sample('modled_updates_total', coalescer['batches'], 'counter', 'Configuration updates applied', **labels)
+        e.sample('modled_writes_queued', unit.coalescer.queued(), 'gauge', 'Writes waiting to be applied', **labels)
+
+        e.sample('modled_datastore_backlog', unit.store.pending(), 'gauge', 'Registers waiting to be written to the database', **labels)
+        if unit.store.histogram:
+            e.histogram('modled_datastore_flush_seconds', unit.store.histogram, 'Time spent writing registers to the database', **labels)
+
+        for stage, summary in unit.tracer.summary().items():
+            for quantile in ('p50', 'p95'):
+                value = summary[f"{quantile}_ms"]
+                if value is not None:
+                    e.sample('modled_write_to_light_seconds', value / 1000, 'gauge',
+                        'Latency from a Modbus write to the light, per stage', stage=stage, quantile=quantile, **labels)
+
+    for function_code, histogram in sorted(requests.items()):
+        e.sample('modled_modbus_requests_total', histogram.count, 'counter', 'Modbus requests executed', function_code=function_code)
+        e.histogram('modled_modbus_request_seconds', histogram, 'Time spent executing a Modbus request', function_code=function_code)
+
+    e.histogram('modled_signal_dispatch_seconds', signals, 'Time spent dispatching the control_signal')
+
+    return e.text()
+
+
+def configuration(units):
+    """The decoded configuration of every unit, as JSON."""
+    return json.dumps({unit.unit: unit.configuration.asDict() for unit in units}, indent=2)
+
+
+def listen(host, port, units, requests, signals):
+    """Serve /metrics and /configuration on the Twisted reactor."""
+    from twisted.internet import reactor
+    from twisted.web.resource import Resource
+    from twisted.web.server import Site
+
+    class Page(Resource):
+        isLeaf = True
+
+        def __init__(self, render, content_type):
+            super(Page, self).__init__()
+            self._render = render
+            self._content_type = content_type
+
+        def render_GET(self, request):
+            request.setHeader(b'Content-Type', self._content_type)
+            return self._render().encode('utf-8')
+
+    root = Resource()
+    root.putChild(b'metrics', Page(lambda: exposition(units, requests, signals), b'text/plain; version=0.0.4; charset=utf-8'))
+    root.putChild(b'configuration', Page(lambda: configuration(units), b'application/json'))
+
+    return reactor.listenTCP(port, Site(root), interface=host)
@@ -0,0 +1,261 @@
+"""
+Framebuffer - whole-frame rendering for ws281x ledstrips
+
+The Framebuffer holds the complete strip as a packed array of 32-bit colors
+(same layout as rpi_ws281x.Color); the programs (see programs.py) render into
+that array a whole frame at a time. Outputs (the actual ledstrip, mocks) only
+need to implement show() and push the pixels to wherever they need to go in one go.
+"""
+
+import functools
+
+import numpy as np
+
+from frameclock import FrameClock
+
+
+def pack(red, green, blue, white=0):
+    """Pack (arrays of) color components into 32-bit colors, like rpi_ws281x.Color."""
+    red = np.asarray(red, dtype=np.uint32)
+    green = np.asarray(green, dtype=np.uint32)
+    blue = np.asarray(blue, dtype=np.uint32)
+    white = np.asarray(white, dtype=np.uint32)
+    return (white << 24) | (red << 16) | (green << 8) | blue
+
+def unpack(pixels):
+    """Unpack an array of 32-bit colors into its red, green and blue components."""
+    pixels = np.asarray(pixels, dtype=np.uint32)
+    return (pixels >> 16) & 0xff, (pixels >> 8) & 0xff, pixels & 0xff
+
+def wheel(pos):
+    """Generate rainbow colors across 0-255 positions for an array of positions."""
+    pos = np.asarray(pos, dtype=np.int64)
+    first = pos < 85
+    second = (pos >= 85) & (pos < 170)
+    offset = np.where(first, pos, np.where(second, pos - 85, pos - 170)) * 3
+    red = np.where(first, offset, np.where(second, 255 - offset, 0))
+    green = np.where(first, 255 - offset, np.where(second, 0, offset))
+    blue = np.where(first, 0, np.where(second, offset, 255 - offset))
+    return pack(red, green, blue)
+
+# NOTE: the rainbow programs only ever use these 256 colors, so we compute them once
+WHEEL = wheel(np.arange(256))
+WHEEL.setflags(write=False)
+
+@functools.lru_cache(maxsize=8)
+def wheel_table(length, modulo=256):
+    """
+    Wheel colors for positions 0 up to length + 256, wrapping at modulo. The colors
+    for a strip of length pixels at step j are then the slice [j:j + length].
+    """
+    table = WHEEL[np.arange(length + 256) % modulo]
+    table.setflags(write=False)
+    return table
+
+@functools.lru_cache(maxsize=8)
+def cycle_table(length):
+    """Wheel positions that distribute the rainbow uniformly across length pixels."""
+    table = np.arange(length) * 256 // length
+    table.setflags(write=False)
+    return table
+
+def blend(outgoing, incoming, weight, out=None):
+    """
+    Blend two frames of packed colors, from outgoing (weight 0) to incoming (weight 256).
+    The colors are blended in place in their packed form: masking every other component
+    leaves room for the product, so two components are blended per multiplication.
+    """
+    outgoing = np.asarray(outgoing, dtype=np.uint32)
+    incoming = np.asarray(incoming, dtype=np.uint32)
+    weight = np.uint32(weight)
+    inverse = np.uint32(256) - weight
+    # NOTE: blue and red, then green and white; a component times at most 256 fits in 16 bits
+    low = (((outgoing & 0x00ff00ff) * inverse + (incoming & 0x00ff00ff) * weight) >> 8) & 0x00ff00ff
+    high = (((outgoing >> 8) & 0x00ff00ff) * inverse + ((incoming >> 8) & 0x00ff00ff) * weight) & 0xff00ff00
+    return np.bitwise_or(low, high, out=out)
+
+def correction_table(gamma=100, red=255, green=255, blue=255):
+    """
+    Lookup tables for the gamma (times 100) and color balance (the level full red, green and
+    blue are shown at) correction: 256 packed colors for each of red, green and blue.
+    """
+    gamma = gamma / 100 if gamma else 1.0
+    levels = (np.arange(256) / 255) ** gamma
+    table = np.empty((3, 256), dtype=np.uint32)
+    for index, (balance, shift) in enumerate(((red, 16), (green, 8), (blue, 0))):
+        table[index] = np.round(levels * min(balance, 255)).astype(np.uint32) << shift
+    table.setflags(write=False)
+    return table
+
+def correct(pixels, table, out=None):
+    """
+    Correct a frame of packed colors with a correction_table: a table lookup per component,
+    for the whole frame at once. White is passed through as is.
+    """
+    pixels = np.asarray(pixels, dtype=np.uint32)
+    out = np.bitwise_and(pixels, 0xff000000, out=out)
+    out |= table[0][(pixels >> 16) & 0xff]
+    out |= table[1][(pixels >> 8) & 0xff]
+    out |= table[2][pixels & 0xff]
+    return out
+
+
+class Framebuffer(object):
+    """
+    An in-memory ledstrip. Provides the pixel API of rpi_ws281x.Adafruit_NeoPixel
+    on top of a numpy array, plus methods that play the ledstrip programs on it.
+    """
+
+    def __init__(self, num, brightness=255, clock=None):
+        self.pixels = np.zeros(num, dtype=np.uint32)
+        self._brightness = brightness
+        self.clock = clock or FrameClock()
+
+        # NOTE: the color correction applied when a frame is shown; None shows the pixels as they are
+        self._correction = None
+        self._correction_key = None
+        self._corrected = None
+
+        # NOTE: a copy of what was shown last, such that outputs can skip showing an unchanged frame
+        self._shown = None
+        self._shown_brightness = None
+        self.skipped = 0
+
+    def __len__(self):
+        return len(self.pixels)
+
+    def __getitem__(self, pos):
+        return self.pixels[pos]
+
+    def __setitem__(self, pos, value):
+        self.pixels[pos] = value
+
+    def numPixels(self):
+        return len(self.pixels)
+
+    def setPixelColor(self, n, color):
+        # NOTE: like the ws281x driver, we silently ignore pixels outside of the strip
+        if 0 <= n < len(self.pixels):
+            self.pixels[n] = color
+
+    def setPixelColorRGB(self, n, red, green, blue, white=0):
+        self.setPixelColor(n, pack(red, green, blue, white))
+
+    def getPixelColor(self, n):
+        return int(self.pixels[n])
+
+    def getPixels(self):
+        return self.pixels
+
+    def setBrightness(self, brightness):
+        self._brightness = brightness
+
+    def getBrightness(self):
+        return self._brightness
+
+    def setCorrection(self, gamma=100, red=255, green=255, blue=255):
+        """Set the gamma and color balance correction for showing frames (see correction_table)."""
+        key = (gamma or 100, red, green, blue)
+        # NOTE: the lookup table is only rebuilt when the correction changes
+        if key == self._correction_key:
+            return
+        self._correction_key = key
+        self._correction = None if key == (100, 255, 255, 255) else correction_table(*key)
+        self.invalidate()
+
+    def corrected(self):
+        """The pixels as they should be shown: corrected, into a buffer of their own, or as they are without a correction."""
+        # NOTE: the correction can be replaced from another thread in the mean time
+        correction = self._correction
+        if correction is None:
+            return self.pixels
+        if self._corrected is None or len(self._corrected) != len(self.pixels):
+            self._corrected = np.empty(len(self.pixels), dtype=np.uint32)
+        return correct(self.pixels, correction, out=self._corrected)
+
+    def show(self):
+        # NOTE: the framebuffer itself has nowhere to send its pixels to; outputs override this
+        pass
+
+    def changed(self):
+        """Whether the pixels or the brightness differ from what was shown last."""
+        # NOTE: what was shown can be forgotten by invalidate() in the mean time, so it's read once
+        shown = self._shown
+        if shown is None or self._shown_brightness != self._brightness:
+            return True
+        return not np.array_equal(shown, self.pixels)
+
+    def markShown(self):
+        """Remember the current pixels and brightness as shown."""
+        shown = self._shown
+        if shown is None or len(shown) != len(self.pixels):
+            self._shown = self.pixels.copy()
+        else:
+            shown[:] = self.pixels
+        self._shown_brightness = self._brightness
+
+    def invalidate(self):
+        """Forget what was shown last, such that the next show() is never skipped."""
+        self._shown = None
+
+    def wheel(self, pos):
+        """Look up the rainbow color for a 0-255 position."""
+        return int(WHEEL[pos & 255])
+
+    def play(self, program, steps=1):
+        """
+        Show the frames of a program (see programs.py) until it has taken steps steps, paced by
+        the frame clock. When a deadline is missed, the program steps past the frames that should
+        have been shown in the mean time, without rendering them.
+        """
+        self.clock.start(program.fps)
+        while program.step < steps:
+            program.render()
+            self.show()
+            if program.fps is None:
+                return
+            program.step += self.clock.tick()
+
+    def run(self, name, steps, color=0):
+        """Play the program registered as name (see programs.py) in color, for steps steps."""
+        # NOTE: the programs render into a Framebuffer, so they're imported when they're played
+        import programs
+        red, green, blue = unpack(color)
+        self.play(programs.create(name, self, {'red': red, 'green': green, 'blue': blue}), steps)
+
+    def fill(self, color, walk=False, reverse=False):
+        if walk:
+            self.run('walk', len(self), color)
+        else:
+            self.pixels[:] = color
+            self.show()
+
+    def clear(self, walk=False, reverse=False):
+        self.fill(0, walk=walk, reverse=reverse)
+
+    def cycle(self, colors, times=1, sleep=1):
+        # TODO: how long should one 'loop' take?
+        self.clock.start(1 / sleep)
+        loop = 0
+        while loop < (len(colors) * times):
+            color = colors[int(loop % len(colors))]
+
+            self.fill(color)
+
+            loop += self.clock.tick()
+
+    def theaterChase(self, color, iterations=10):
+        """Movie theater light style chaser animation."""
+        self.run('theater_chase', 3 * iterations, color)
+
+    def rainbow(self, iterations=1):
+        """Draw rainbow that fades across all pixels at once."""
+        self.run('rainbow', 256 * iterations)
+
+    def rainbowCycle(self, iterations=5):
+        """Draw rainbow that uniformly distributes itself across all pixels."""
+        self.run('rainbow_cycle', 256 * iterations)
+
+    def theaterChaseRainbow(self):
+        """Rainbow movie theater light style chaser animation."""
+        self.run('theater_chase_rainbow', 3 * 256)
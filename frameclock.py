@@ -0,0 +1,123 @@
+"""
+FrameClock - deadline based pacing of ledstrip frames
+
+Instead of sleeping for a fixed time after rendering a frame, the FrameClock
+sleeps until the absolute deadline of the next frame. Time spent rendering and
+showing a frame (and oversleeping by the OS) is taken from the time left until
+the deadline, so the animation speed no longer depends on the strip length or
+the speed of the CPU.
+"""
+
+import math
+import time
+
+FPS = 50
+MAX_CATCHUP = 5 # frames
+
+
+class FrameClock(object):
+    """
+    Paces frames at a target fps. When a frame overruns its deadline, the
+    clock either skips the frames that should have been shown in the mean
+    time (skip=True, the default) or shows them without sleeping until it
+    has caught up, for at most max_catchup frames.
+    """
+
+    def __init__(self, fps=FPS, skip=True, max_catchup=MAX_CATCHUP):
+        self.skip = skip
+        self.max_catchup = max_catchup
+
+        self.frames = 0     # frames shown
+        self.missed = 0     # deadlines that were missed
+        self.dropped = 0    # frames skipped to make up for missed deadlines
+        self.busy = 0.0     # seconds spent rendering and showing frames, i.e. not waiting for a deadline
+        self.busy_max = 0.0 # the longest time spent on a single frame, since resetMaximum()
+
+        self.histogram = None # NOTE: optionally, e.g. an exporter.Histogram of the time spent per frame
+
+        self._deadline = None
+        self._woke = None
+        self.start(fps)
+
+    def start(self, fps=None):
+        """(Re)start pacing, optionally at a new fps; the first deadline is one period from now."""
+        if fps:
+            self.fps = fps
+            self.period = 1.0 / fps
+        self._deadline = None
+        self._woke = None
+
+    def tick(self, event=None):
+        """
+        Wait for the deadline of the next frame. Returns the number of frames the
+        animation should advance: 1 when on time, more when frames were skipped.
+        With an event (a threading.Event), the wait is cut short when it is set.
+        """
+        delay, advance = self._schedule()
+        if delay > 0:
+            if event is not None:
+                event.wait(delay)
+            else:
+                time.sleep(delay)
+        self._woke = time.monotonic()
+        return advance
+
+    async def atick(self):
+        """Like tick(), but waits for the deadline on the asyncio event loop."""
+        import asyncio
+
+        delay, advance = self._schedule()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._woke = time.monotonic()
+        return advance
+
+    def _schedule(self):
+        """Returns the time left until the deadline of the next frame and the number of frames to advance."""
+        now = time.monotonic()
+        if self._deadline is None:
+            self._deadline = now + self.period
+
+        if self._woke is not None:
+            # NOTE: the time since we woke up for the previous frame went into this frame
+            busy = now - self._woke
+            self.busy += busy
+            self.busy_max = max(self.busy_max, busy)
+            if self.histogram:
+                self.histogram.observe(busy)
+
+        self.frames += 1
+        late = now - self._deadline
+        if late <= 0:
+            self._deadline += self.period
+            return -late, 1
+
+        self.missed += 1
+        behind = math.floor(late / self.period)
+        if self.skip:
+            # NOTE: skip the frames we're behind on and aim for the first deadline still ahead
+            self.dropped += behind
+            self._deadline += (behind + 1) * self.period
+            return 0, behind + 1
+
+        if behind > self.max_catchup:
+            # NOTE: too far behind to catch up; start over from now
+            self.dropped += behind
+            self._deadline = now + self.period
+        else:
+            # NOTE: no sleeping until we're back on schedule
+            self._deadline += self.period
+        return 0, 1
+
+    def resetMaximum(self):
+        self.busy_max = 0.0
+
+    def statistics(self):
+        return {
+            'fps': self.fps,
+            'frames': self.frames,
+            'missed': self.missed,
+            'dropped': self.dropped,
+            'busy': self.busy,
+            'busy_max': self.busy_max
+        }
@@ -1,12 +1,14 @@
 import argparse
-import asyncio
 import logging
 import signal
-import sys
-import time
-import queue
+import threading
+import ctypes
 
 from rpi_ws281x import *
+import _rpi_ws281x as ws
+
+from framebuffer import Framebuffer
+from frameclock import FrameClock
 
 from signals.signals import Signal
 switch = Signal(providing_args=['switch'])
@@ -20,7 +22,6 @@ LED_BRIGHTNESS = 255
 
 COLOR = Color(255, 255, 255)
 CLEAR = Color(0, 0, 0)      # clear (or second color)
-SLEEP=50/1000 # 50 milliseconds
 
 handler = logging.StreamHandler()
 formatter = logging.Formatter('%(asctime)s - %(name)-20s - %(levelname)-16s - %(message)s')
@@ -28,90 +29,171 @@ handler.setFormatter(formatter)
 logging.basicConfig(level=logging.DEBUG, handlers=[handler])
 logger = logging.getLogger(__name__)
 
-class Ledstrip(Adafruit_NeoPixel):
+class Ledstrip(Framebuffer, Adafruit_NeoPixel):
+    """
+    A Framebuffer that outputs to a ws281x ledstrip. The programs are rendered by the
+    Framebuffer; show() pushes the complete frame to the driver in one bulk copy.
+    """
 
-    def fill(self, color, walk=False, reverse=False):
-        if walk:
-            for index in range(self.numPixels()):
-                self.setPixelColor(index, color)
-                self.show()
-                time.sleep(SLEEP)
-        else:
-            for index in range(self.numPixels()):
-                self.setPixelColor(index, color)
-            self.show()
-    
-    def clear(self, walk=False, reverse=False):
-        if walk:
-            for index in range(self.numPixels()):
-                self.setPixelColor(index, CLEAR)
-                self.show()
-                time.sleep(SLEEP)
-        else:
-            for index in range(self.numPixels()):
-                self.setPixelColor(index, CLEAR)
-            self.show()
-
-    def cycle(self, colors, times=1, sleep=1):
-        # TODO: how long should one 'loop' take?
-        loop = 0
-        while loop < (len(colors) * times):
-            color = colors[int(loop % len(colors))]
-
-            self.fill(color)
-            self.show()
-            
-            time.sleep(sleep)
-            loop += 1
-
-    def theaterChase(self, color, iterations=10):
-        """Movie theater light style chaser animation."""
-        for j in range(iterations):
-            for q in range(3):
-                for i in range(0, self.numPixels(), 3):
-                    self.setPixelColor(i+q, color)
-                self.show()
-                time.sleep(SLEEP)
-                for i in range(0, self.numPixels(), 3):
-                    self.setPixelColor(i+q, 0)
-
-    def wheel(self, pos):
-        """Generate rainbow colors across 0-255 positions."""
-        if pos < 85:
-            return Color(pos * 3, 255 - pos * 3, 0)
-        elif pos < 170:
-            pos -= 85
-            return Color(255 - pos * 3, 0, pos * 3)
+    def __init__(self, num, pin, freq_hz=800000, dma=10, invert=False, brightness=255, channel=0):
+        Adafruit_NeoPixel.__init__(self, num, pin, freq_hz, dma, invert, brightness, channel)
+        Framebuffer.__init__(self, num, brightness)
+        self._leds = None
+
+    def begin(self):
+        Adafruit_NeoPixel.begin(self)
+        self.invalidate()
+        # NOTE: the led buffer of the channel is allocated by ws2811_init(), so we can only look it up after begin()
+        try:
+            self._leds = int(ws.ws2811_channel_t_leds_get(self._channel))
+        except (TypeError, ValueError) as e:
+            logger.debug(f"Bulk copy to led buffer not available: {e}")
+            self._leds = None
+
+    def setBrightness(self, brightness):
+        Framebuffer.setBrightness(self, brightness)
+        Adafruit_NeoPixel.setBrightness(self, brightness)
+
+    def show(self):
+        # NOTE: no need to render the same frame again; it would only cost us a DMA transfer
+        if not self.changed():
+            self.skipped += 1
+            return
+        self._upload(self.corrected())
+        Adafruit_NeoPixel.show(self)
+        self.markShown()
+
+    def _upload(self, pixels):
+        if self._leds:
+            # NOTE: the driver stores the leds as uint32_t, which is exactly the layout of our framebuffer
+            ctypes.memmove(self._leds, pixels.ctypes.data, pixels.nbytes)
         else:
-            pos -= 170
-            return Color(0, pos * 3, 255 - pos * 3)
-
-    def rainbow(self, iterations=1):
-        """Draw rainbow that fades across all pixels at once."""
-        for j in range(256 * iterations):
-            for i in range(self.numPixels()):
-                self.setPixelColor(i, self.wheel((i+j) & 255))
-            self.show()
-            time.sleep(0.02)
-
-    def rainbowCycle(self, iterations=5):
-        """Draw rainbow that uniformly distributes itself across all pixels."""
-        for j in range(256 * iterations):
-            for i in range(self.numPixels()):
-                self.setPixelColor(i, self.wheel((int(i * 256 / self.numPixels()) + j) & 255))
-            self.show()
-            time.sleep(0.02)
-
-    def theaterChaseRainbow(self):
-        """Rainbow movie theater light style chaser animation."""
-        for j in range(256):
-            for q in range(3):
-                for i in range(0, self.numPixels(), 3):
-                    self.setPixelColor(i+q, self.wheel((i+j) % 255))
-                self.show()
-                time.sleep(SLEEP)
-                for i in range(0, self.numPixels(), 3):
-                    self.setPixelColor(i+q, 0)
+            self._led_data[0:len(pixels)] = pixels.tolist()
+
+
+class LedstripGroup(object):
+    """
+    Drives the (at most two) PWM channels of one ws281x device. Every channel renders into
+    its own LedstripChannel; whatever channels changed are rendered together, in a single
+    DMA transfer, at most fps times per second. A channel is configured as (num, pin, brightness);
+    the first one goes to PWM channel 0 (e.g. GPIO 18), the second one to channel 1 (e.g. GPIO 13).
+    """
+
+    def __init__(self, strips, freq_hz=LED_FREQUENCE, dma=LED_DMA, invert=LED_INVERT, fps=50):
+        if len(strips) > 2:
+            raise ValueError(f"A ws281x device drives at most 2 channels, not {len(strips)}")
+
+        self._leds = ws.new_ws2811_t()
+        for index in range(2):
+            channel = ws.ws2811_channel_get(self._leds, index)
+            ws.ws2811_channel_t_count_set(channel, 0)
+            ws.ws2811_channel_t_gpionum_set(channel, 0)
+            ws.ws2811_channel_t_invert_set(channel, 0)
+            ws.ws2811_channel_t_brightness_set(channel, 0)
+
+        self._channels = []
+        for index, (num, pin, brightness) in enumerate(strips):
+            channel = ws.ws2811_channel_get(self._leds, index)
+            ws.ws2811_channel_t_count_set(channel, num)
+            ws.ws2811_channel_t_gpionum_set(channel, pin)
+            ws.ws2811_channel_t_invert_set(channel, 1 if invert else 0)
+            ws.ws2811_channel_t_brightness_set(channel, brightness)
+            ws.ws2811_channel_t_strip_type_set(channel, ws.WS2811_STRIP_GRB)
+            self._channels.append(channel)
+
+        ws.ws2811_t_freq_set(self._leds, freq_hz)
+        ws.ws2811_t_dmanum_set(self._leds, dma)
+
+        self._lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._stop_event = threading.Event()
+        self._clock = FrameClock(fps)
+        self._thread = None
+        self._buffers = None
+
+        self.renders = 0
+
+    def channel(self, index):
+        """A LedstripChannel for one of the channels of the group."""
+        num = ws.ws2811_channel_t_count_get(self._channels[index])
+        brightness = ws.ws2811_channel_t_brightness_get(self._channels[index])
+        return LedstripChannel(self, index, num, brightness)
+
+    def begin(self):
+        with self._lock:
+            if self._thread:
+                return
+            resp = ws.ws2811_init(self._leds)
+            if resp != 0:
+                str_resp = ws.ws2811_get_return_t_str(resp)
+                raise RuntimeError(f"ws2811_init failed with code {resp} ({str_resp})")
+            self._buffers = []
+            for channel in self._channels:
+                try:
+                    self._buffers.append(int(ws.ws2811_channel_t_leds_get(channel)))
+                except (TypeError, ValueError):
+                    self._buffers.append(None)
+            self._thread = threading.Thread(target=self._run, name='LedstripGroup', daemon=True)
+            self._thread.start()
+
+    def submit(self, index, pixels, brightness):
+        """Hand the frame for a channel to the group; it is shown with the next render."""
+        with self._lock:
+            channel = self._channels[index]
+            if self._buffers[index]:
+                ctypes.memmove(self._buffers[index], pixels.ctypes.data, pixels.nbytes)
+            else:
+                for n, color in enumerate(pixels.tolist()):
+                    ws.ws2811_led_set(channel, n, color)
+            ws.ws2811_channel_t_brightness_set(channel, brightness)
+        self._dirty.set()
+
+    def stop(self):
+        self._stop_event.set()
+        self._dirty.set()
+        if self._thread:
+            self._thread.join()
+            # NOTE: render once more, such that e.g. clearing the channels on shutdown is shown
+            with self._lock:
+                ws.ws2811_render(self._leds)
+            ws.ws2811_fini(self._leds)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            if not self._dirty.is_set():
+                # NOTE: nothing to render; block until a channel submits, then restart the pacing
+                self._dirty.wait()
+                self._clock.start()
+            if self._stop_event.is_set():
+                break
+            self._dirty.clear()
+            with self._lock:
+                resp = ws.ws2811_render(self._leds)
+            if resp != 0:
+                str_resp = ws.ws2811_get_return_t_str(resp)
+                logger.error(f"ws2811_render failed with code {resp} ({str_resp})")
+            self.renders += 1
+            self._clock.tick()
+
+
+class LedstripChannel(Framebuffer):
+    """A Framebuffer for one channel of a LedstripGroup; show() hands the frame to the group."""
+
+    def __init__(self, group, index, num, brightness=255):
+        super(LedstripChannel, self).__init__(num, brightness)
+        self._group = group
+        self._index = index
+
+    def begin(self):
+        self._group.begin()
+        self.invalidate()
+
+    def show(self):
+        if not self.changed():
+            self.skipped += 1
+            return
+        self._group.submit(self._index, self.corrected(), self._brightness)
+        self.markShown()
 
 
 def program1(strip):
@@ -193,21 +275,6 @@ class SwitchableLedstrip(Ledstrip):
         raise LedstripSwitchException('Triggered LedstripSwitchException')
 
 
-class ExceptionRaisingLedstrip(Ledstrip):
-    def __init__(self, queue: queue.Queue, num, pin, freq_hz=800000, dma=10, invert=False, brightness=255, channel=0):
-        super(ExceptionRaisingLedstrip, self).__init__(num, pin, freq_hz, dma, invert, brightness, channel)
-        self._queue = queue
-
-    def show(self):
-        # NOTE: we're overriding the show() function as a natural break point during normal ledstrip operation
-        if not self._queue.empty():
-            value = self._queue.get() # NOTE: we're not doing anything with the value
-            raise LedstripSwitchException()
-
-        # TODO: fix this?
-        super(ExceptionRaisingLedstrip, self).show()
-
-
 class LedstripController(object):
     def __init__(self):
 
@@ -0,0 +1,98 @@
+"""
+ModLed metrics - live runtime metrics as Modbus input registers
+
+The metrics of a unit are published in a block of input registers, such that they
+can be monitored from the same SCADA system that controls the ledstrip. The block
+is kept in memory only. A MetricsCollector refreshes it periodically, so reading
+the metrics is a plain lookup in the CachedSlaveContext and never touches SQLite.
+"""
+
+import collections
+import time
+
+# NOTE: the addresses of the input registers as used in the Modbus requests, i.e. 30000 is address 0
+ADDRESS_FPS = 0             # frames shown per second, times 100
+ADDRESS_RENDER_AVERAGE = 1  # average time spent rendering and showing a frame, in microseconds
+ADDRESS_RENDER_MAX = 2      # longest time spent rendering and showing a frame, in microseconds
+ADDRESS_MISSED = 3          # frame deadlines missed since the start, 32 bits: high word, low word
+ADDRESS_QUEUED = 5          # writes waiting in the coalescer to be applied
+ADDRESS_SWITCHES = 6        # program switches in the last minute
+ADDRESS_BACKLOG = 7         # registers waiting to be flushed to the database
+
+ADDRESS = 0
+COUNT = 8
+
+INTERVAL = 1.0 # seconds
+WORD = 0xffff
+
+
+def _word(value):
+    """Clamp a value to a single unsigned 16-bit register."""
+    return max(0, min(int(value), WORD))
+
+
+class MetricsCollector(object):
+    """
+    Computes the metrics of a unit and writes them to its input registers whenever
+    update() is called, which the server does every INTERVAL seconds. Rates and averages
+    are computed over the time since the previous update.
+    """
+
+    def __init__(self, unit):
+        self._unit = unit
+        self._previous = None
+        # NOTE: (time, switches) samples for the last minute, for the switches per minute
+        self._switches = collections.deque([(time.monotonic(), 0)])
+
+        self.latest = None # the metrics of the last update
+
+        unit.store.addVolatile('i', ADDRESS, COUNT)
+
+    def collect(self):
+        """The metrics as a dictionary."""
+        now = time.monotonic()
+        controller = self._unit.controller
+        statistics = controller.getStatistics()
+
+        fps, render_average = 0.0, 0.0
+        if self._previous:
+            then, previous = self._previous
+            frames = statistics['frames'] - previous['frames']
+            if frames > 0:
+                fps = frames / (now - then)
+                render_average = (statistics['busy'] - previous['busy']) / frames
+        self._previous = (now, statistics)
+
+        self._switches.append((now, controller.switches))
+        while self._switches[0][0] < now - 60:
+            self._switches.popleft()
+
+        return {
+            'fps': fps,
+            'render_average': render_average,
+            'render_max': statistics['busy_max'],
+            'missed': statistics['missed'],
+            'queued': self._unit.coalescer.queued(),
+            'switches': controller.switches - self._switches[0][1],
+            'backlog': self._unit.store.pending()
+        }
+
+    def update(self):
+        """Collect the metrics and write them to the input registers."""
+        metrics = self.collect()
+        # NOTE: the maximum is taken per update
+        self._unit.controller.resetMaximum()
+
+        values = [0] * COUNT
+        values[ADDRESS_FPS - ADDRESS] = _word(metrics['fps'] * 100)
+        values[ADDRESS_RENDER_AVERAGE - ADDRESS] = _word(metrics['render_average'] * 1000000)
+        values[ADDRESS_RENDER_MAX - ADDRESS] = _word(metrics['render_max'] * 1000000)
+        values[ADDRESS_MISSED - ADDRESS] = (metrics['missed'] >> 16) & WORD
+        values[ADDRESS_MISSED - ADDRESS + 1] = metrics['missed'] & WORD
+        values[ADDRESS_QUEUED - ADDRESS] = _word(metrics['queued'])
+        values[ADDRESS_SWITCHES - ADDRESS] = _word(metrics['switches'])
+        values[ADDRESS_BACKLOG - ADDRESS] = _word(metrics['backlog'])
+
+        self._unit.store.setValues(4, ADDRESS, values) # write input registers
+        self.latest = metrics
+        return metrics
@@ -0,0 +1,130 @@
+"""
+ModLed Modbus - the requests the Modbus server executes
+
+Writes to the holding registers are executed by our own requests, which send the
+control_signal to the handler of the unit that was written to. The other requests are
+the ones from pymodbus, timed. Importing pymodbus takes a while, so this module is only
+imported once the server is started.
+"""
+
+import logging
+import time
+
+from pymodbus.device import ModbusDeviceIdentification
+from pymodbus.pdu import ModbusResponse
+from pymodbus.bit_read_message import ReadCoilsRequest, ReadDiscreteInputsRequest
+from pymodbus.bit_write_message import WriteSingleCoilRequest, WriteMultipleCoilsRequest
+from pymodbus.register_read_message import ReadHoldingRegistersRequest, ReadInputRegistersRequest
+from pymodbus.register_write_message import WriteSingleRegisterRequest, WriteMultipleRegistersRequest
+
+from exporter import Histogram, REQUEST_BUCKETS, SIGNAL_BUCKETS
+from signals.signals import Signal
+
+logger = logging.getLogger(__name__)
+
+# NOTE: the sender of the control_signal is the slave context (unit) the request was executed against
+# NOTE: received is the time.perf_counter() at which the request was executed, for tracing the latency
+# NOTE: the control_signal is sent for every write; with use_snapshot, sending it doesn't take a lock
+control_signal = Signal(providing_args=['address', 'values', 'received'], use_snapshot=True)
+
+# NOTE: the time spent executing the Modbus requests, per function code, and dispatching the control_signal
+request_histograms = {}
+signal_histogram = Histogram(SIGNAL_BUCKETS)
+
+def observe_request(function_code, started):
+    histogram = request_histograms.get(function_code)
+    if histogram is None:
+        histogram = request_histograms.setdefault(function_code, Histogram(REQUEST_BUCKETS))
+    histogram.observe(time.perf_counter() - started)
+
+def send_control_signal(context, **kwargs):
+    started = time.perf_counter()
+    control_signal.send_robust(sender=context, **kwargs)
+    signal_histogram.observe(time.perf_counter() - started)
+
+class SingleLedstripControlRequest(WriteSingleRegisterRequest):
+
+    def __init__(self, address=None, **kwargs):
+        super(SingleLedstripControlRequest, self).__init__(address=address, **kwargs)
+
+    def execute(self, context):
+        received = time.perf_counter()
+        result = super().execute(context)
+
+        if isinstance(result, ModbusResponse) and not result.isError():
+            address = result.address
+            value = result.value
+
+            logger.debug(f"Value {value} written at {address}") # NOTE: the address reported here should probably be incremented to properly reflect the value in get/set-values
+
+            logger.debug('sending control_signal...')
+
+            send_control_signal(context, address=address, values=[value], received=received)
+
+            logger.debug('control_signal sent')
+
+        observe_request(self.function_code, received)
+        return result
+
+class MultipleLedstripControlRequest(WriteMultipleRegistersRequest):
+
+    def __init__(self, address=None, **kwargs):
+        super(MultipleLedstripControlRequest, self).__init__(address=address, **kwargs)
+
+    def execute(self, context):
+        received = time.perf_counter()
+        result = super().execute(context)
+
+        if isinstance(result, ModbusResponse) and not result.isError():
+            address = result.address
+            count = result.count
+
+            logger.debug(f"Written {count} values at {address}") # NOTE: the address reported here should probably be incremented to properly reflect the value in get/set-values
+
+            logger.debug('sending control_signal...')
+
+            send_control_signal(context, address=address, values=self.values, received=received)
+
+            logger.debug('control_signal sent')
+
+        observe_request(self.function_code, received)
+        return result
+
+class TimedRequest(object):
+    """Records the time spent executing requests; mixed into the standard requests of pymodbus."""
+
+    def execute(self, context):
+        started = time.perf_counter()
+        try:
+            return super().execute(context)
+        finally:
+            observe_request(self.function_code, started)
+
+def timed(request):
+    return type(f"Timed{request.__name__}", (TimedRequest, request), {})
+
+# NOTE: the requests the server decodes with our own implementation instead of the one from pymodbus
+CUSTOM_FUNCTIONS = [
+    SingleLedstripControlRequest,
+    MultipleLedstripControlRequest,
+    timed(ReadCoilsRequest),
+    timed(ReadDiscreteInputsRequest),
+    timed(ReadHoldingRegistersRequest),
+    timed(ReadInputRegistersRequest),
+    timed(WriteSingleCoilRequest),
+    timed(WriteMultipleCoilsRequest)
+]
+
+
+def create_identity():
+
+    # NOTE: initializing the Modbus server identification
+    identity = ModbusDeviceIdentification()
+    identity.VendorName = 'hslatman'
+    identity.ProductCode = 'MLS'
+    identity.VendorUrl = 'https://github.com/hslatman/modled'
+    identity.ProductName = 'ModLed Server'
+    identity.ModelName = 'ModLed X'
+    identity.MajorMinorRevision = '0.1.0'
+
+    return identity
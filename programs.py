@@ -0,0 +1,152 @@
+"""
+ModLed programs - resumable ledstrip programs
+
+Every program is a state object that renders a single frame of its animation at a
+time into a Framebuffer. The phase of the animation is the step of the program,
+so a controller can switch, pause or retune programs between any two frames,
+without interrupting a running loop. Retuning (e.g. changing the color of a
+theater chase) keeps the phase of the animation.
+
+Programs are registered by name. A new program only needs to subclass Program
+and register itself; the controllers look programs up in the registry.
+"""
+
+from framebuffer import pack, wheel_table, cycle_table
+from stream import STREAM_FPS
+
+PROGRAMS = {}
+
+
+def register(*names):
+    """Class decorator registering a program under one or more names."""
+    def decorator(cls):
+        for name in names:
+            PROGRAMS[name] = cls
+        return cls
+    return decorator
+
+
+def create(name, framebuffer, configuration, stream=None):
+    """Create the program called name for framebuffer; unknown programs show a fixed color."""
+    return PROGRAMS.get(name, PROGRAMS['fixed'])(framebuffer, configuration, stream)
+
+
+class Program(object):
+    """
+    A ledstrip program. render() renders the frame for the current step; the fps is
+    the rate at which steps are taken, or None for a static frame.
+    """
+
+    fps = None
+
+    def __init__(self, framebuffer, configuration, stream=None):
+        self.framebuffer = framebuffer
+        self.stream = stream
+        self.step = 0
+        self.configure(configuration)
+
+    def configure(self, configuration):
+        """Retune the program to a new configuration; the step is kept."""
+        self.color = int(pack(configuration['red'], configuration['green'], configuration['blue']))
+
+    def render(self):
+        """Render the frame for the current step into the framebuffer."""
+        raise NotImplementedError
+
+    def frames(self):
+        """A frame generator: renders the frame for a step and advances, once per frame."""
+        while True:
+            self.render()
+            yield
+            self.step += 1
+            if self.fps is None:
+                return
+
+
+@register('fixed')
+class Fixed(Program):
+
+    def render(self):
+        self.framebuffer.pixels[:] = self.color
+
+
+@register('off')
+class Off(Program):
+
+    def configure(self, configuration):
+        self.color = 0
+
+    def render(self):
+        self.framebuffer.pixels[:] = 0
+
+
+@register('walk')
+class Walk(Program):
+    """Sets the pixels to the color one by one."""
+    fps = 20
+
+    def render(self):
+        self.framebuffer.pixels[:self.step + 1] = self.color
+
+
+@register('rainbow')
+class Rainbow(Program):
+    fps = 50
+
+    def render(self):
+        length = len(self.framebuffer)
+        step = self.step & 255
+        self.framebuffer.pixels[:] = wheel_table(length)[step:step + length]
+
+
+@register('rainbow_cycle')
+class RainbowCycle(Program):
+    fps = 50
+
+    def render(self):
+        positions = cycle_table(len(self.framebuffer))
+        self.framebuffer.pixels[:] = wheel_table(256)[positions + (self.step & 255)]
+
+
+# TODO: implement the actual strandtest
+@register('theater_chase', 'strand_test')
+class TheaterChase(Program):
+    fps = 20
+
+    def render(self):
+        pixels = self.framebuffer.pixels
+        pixels[:] = 0
+        pixels[self.step % 3::3] = self.color
+
+
+@register('theater_chase_rainbow')
+class TheaterChaseRainbow(Program):
+    fps = 20
+
+    def render(self):
+        pixels = self.framebuffer.pixels
+        length = len(pixels)
+        j, q = (self.step // 3) % 256, self.step % 3
+        table = wheel_table(length, modulo=255)
+        pixels[:] = 0
+        # NOTE: the last lit position can fall off the end of the strip for q > 0
+        count = len(pixels[q::3])
+        pixels[q::3] = table[j:j + length:3][:count]
+
+
+@register('stream')
+class Stream(Program):
+    """Copies the latest frame committed to the StreamBuffer, whenever there is a new one."""
+    fps = STREAM_FPS
+
+    def __init__(self, framebuffer, configuration, stream=None):
+        super(Stream, self).__init__(framebuffer, configuration, stream)
+        self._sequence = None
+
+    def render(self):
+        if self.stream is None or self.stream.sequence == self._sequence:
+            return
+        self._sequence = self.stream.sequence
+        frame = self.stream.frame
+        count = min(len(frame), len(self.framebuffer))
+        self.framebuffer.pixels[:count] = frame[:count]
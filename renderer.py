@@ -0,0 +1,213 @@
+"""
+Renderer - rendering the ledstrip programs in a separate process
+
+Rendering the programs shares the GIL with the Modbus server. Long strips and
+heavy programs then delay Modbus responses, while bursts of Modbus requests make
+the animations stutter. The renderer runs the programs in a worker process
+instead. The worker renders into a double buffer in shared memory and flips it
+when a frame is complete, so the output side in the server process only ever
+reads finished frames, without copying them between processes.
+
+Changes in configuration travel to the worker over a pipe, as small messages:
+('configure', configuration), ('notify', generation) and ('stop', None). A
+warm restart (see snapshot.py) sends ('resume', (step, frame)) before anything else.
+"""
+
+import logging
+import signal
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from framebuffer import Framebuffer
+from transition import Crossfader
+import programs
+
+logger = logging.getLogger(__name__)
+
+# NOTE: the header holds int64 values: the sequence number, index, generation and program step of the front
+# frame, followed by the statistics of the frame clock of the worker and a counter for resetting its maximum
+STATISTICS = ['fps', 'frames', 'missed', 'dropped', 'busy', 'busy_max'] # fps in millihertz, busy and busy_max in microseconds
+HEADER = 4 + len(STATISTICS) + 1
+
+STOP_TIMEOUT = 2.0 # seconds the server waits for the worker to stop
+
+
+class SharedFrames(object):
+    """
+    Two frames of num pixels in shared memory. The writer renders into back() and
+    makes it the front frame with flip(); readers get the front frame from read().
+    A reader should be done with a frame before the writer has flipped twice more,
+    i.e. within a frame period, because the writer then renders into it again.
+    """
+
+    def __init__(self, num, name=None):
+        size = HEADER * 8 + 2 * num * 4
+        self._memory = shared_memory.SharedMemory(name=name, create=name is None, size=size)
+        self._owner = name is None
+
+        self._header = np.ndarray(HEADER, dtype=np.int64, buffer=self._memory.buf)
+        self._frames = np.ndarray((2, num), dtype=np.uint32, buffer=self._memory.buf, offset=HEADER * 8)
+        if self._owner:
+            self._header[:] = 0
+            self._frames[:] = 0
+
+    @property
+    def name(self):
+        return self._memory.name
+
+    def back(self):
+        """The frame to render into."""
+        return self._frames[1 - self._header[1]]
+
+    def flip(self, generation=0, step=0):
+        """
+        Make the back frame the front frame; generation is the notification it was rendered
+        for and step the step of the program that rendered it.
+        """
+        # NOTE: the index is switched before the sequence is incremented; a reader seeing the new sequence sees the new frame
+        self._header[2] = generation
+        self._header[3] = step
+        self._header[1] = 1 - self._header[1]
+        self._header[0] += 1
+
+    def read(self):
+        """The sequence number and a view of the front frame."""
+        sequence = int(self._header[0])
+        return sequence, self._frames[self._header[1]]
+
+    def generation(self):
+        """The generation of the front frame."""
+        return int(self._header[2])
+
+    def step(self):
+        """The step of the program that rendered the front frame."""
+        return int(self._header[3])
+
+    def publish(self, statistics):
+        """Publish the statistics of the frame clock of the writer."""
+        self._header[4:4 + len(STATISTICS)] = [
+            statistics['fps'] * 1000,
+            statistics['frames'],
+            statistics['missed'],
+            statistics['dropped'],
+            statistics['busy'] * 1000000,
+            statistics['busy_max'] * 1000000
+        ]
+
+    def statistics(self):
+        """The statistics of the frame clock of the writer, like FrameClock.statistics()."""
+        fps, frames, missed, dropped, busy, busy_max = (int(value) for value in self._header[4:4 + len(STATISTICS)])
+        return {
+            'fps': fps / 1000,
+            'frames': frames,
+            'missed': missed,
+            'dropped': dropped,
+            'busy': busy / 1000000,
+            'busy_max': busy_max / 1000000
+        }
+
+    def resetMaximum(self):
+        """Ask the writer to reset the maximum of its frame clock."""
+        self._header[-1] += 1
+
+    def resets(self):
+        return int(self._header[-1])
+
+    def close(self):
+        # NOTE: the views into the shared memory have to be released before it can be closed
+        del self._header
+        del self._frames
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
+
+
+def program(framebuffer, configuration):
+    """The configured program for framebuffer."""
+    # NOTE: the stream buffer lives in the server, which shows the streamed frames itself
+    if not configuration['on'] or configuration['program'] == 'stream':
+        return programs.create('off', framebuffer, configuration)
+    return programs.create(configuration['program'], framebuffer, configuration)
+
+
+def render(name, num, connection, ready):
+    """
+    The worker process: renders the configured program into the SharedFrames called name
+    and sets the ready event for every frame. Streamed frames are not rendered by the worker;
+    the server shows those straight from the stream buffer.
+    """
+    # NOTE: the worker is stopped by the server; a SIGINT for the process group is meant for the server
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    frames = SharedFrames(num, name=name)
+    framebuffer = Framebuffer(num)
+    crossfader = Crossfader(framebuffer)
+    configuration = None
+    generator, fps = None, None
+    switch = True # NOTE: the first program is switched to as well
+    resume = None # NOTE: the step to resume the first program at
+    generation = 0
+    resets = 0
+
+    try:
+        while True:
+            # NOTE: without an animation running, we block until there's a message; after a crossfade, the program continues
+            while connection.poll(0 if fps else None):
+                command, payload = connection.recv()
+                if command == 'stop':
+                    return
+                elif command == 'resume':
+                    # NOTE: the first program crossfades from the frame the server shows already
+                    resume, frame = payload
+                    np.copyto(framebuffer.pixels, frame)
+                elif command == 'configure':
+                    configuration = payload
+                    crossfader.retune(configuration)
+                elif command == 'notify':
+                    generator = None
+                    switch = True
+                    generation = payload or 0
+
+                if generator is None:
+                    break
+
+            if configuration is None:
+                continue
+
+            if generator is None:
+                if switch:
+                    switch = False
+                    # NOTE: streamed frames are shown by the server, so there's nothing to crossfade
+                    streaming = configuration['on'] and configuration['program'] == 'stream'
+                    duration = 0 if streaming else configuration.get('transition', 0) / 1000
+                    crossfader.switch(lambda layer: program(layer, configuration), duration)
+                    if resume is not None:
+                        crossfader.program.step = resume
+                        # NOTE: the first notification switches again, to the same program; it resumes as well
+                        if generation:
+                            resume = None
+                generator, fps = crossfader.frames()
+                if fps:
+                    framebuffer.clock.start(fps)
+
+            if next(generator, StopIteration) is StopIteration:
+                if fps:
+                    # NOTE: the crossfade has ended; the program continues
+                    generator = None
+                continue
+
+            np.copyto(frames.back(), framebuffer.pixels)
+            frames.flip(generation, crossfader.program.step)
+            ready.set()
+
+            if fps:
+                # NOTE: after a missed deadline, the animation steps past the frames that weren't rendered
+                crossfader.skip(framebuffer.clock.tick() - 1)
+
+            if frames.resets() != resets:
+                resets = frames.resets()
+                framebuffer.clock.resetMaximum()
+            frames.publish(framebuffer.clock.statistics())
+    finally:
+        frames.close()
@@ -3,33 +3,19 @@
 ModLed - Driving a ws281x ledstrip using Modbus
 """
 
+import time
+
+from startup import StartupProfile
+# NOTE: the startup is profiled from here on; see --profile-startup
+profile = StartupProfile()
+
 import argparse
+import importlib
 import logging
 import signal
-import struct
-import sqlite3
 import threading
-import time
-import queue
-
-from pymodbus.server.asynchronous import StartTcpServer, StopServer
-from pymodbus.device import ModbusDeviceIdentification
-from pymodbus.datastore import ModbusSequentialDataBlock, ModbusSlaveContext, ModbusServerContext
-from pymodbus.datastore.database import SqlSlaveContext
-from pymodbus.pdu import ModbusRequest, ModbusResponse
-from pymodbus.register_write_message import WriteSingleRegisterRequest, WriteSingleRegisterResponse, WriteMultipleRegistersRequest, WriteMultipleRegistersResponse
-
-from twisted.logger._levels import LogLevel
-from twisted.internet import reactor
-from twisted.internet import task
-from twisted.python import log
-
-import sqlalchemy
-import sqlalchemy.types as sqltypes
-from sqlalchemy.sql import and_
-from sqlalchemy.schema import UniqueConstraint
-from sqlalchemy.sql.expression import bindparam
-from sqlalchemy import select, func
+
+import numpy as np
 
 FORMAT = ('%(asctime)-15s %(threadName)-15s'
           ' %(levelname)-8s %(module)-15s:%(lineno)-8s %(message)s')
@@ -37,243 +23,506 @@ logging.basicConfig(format=FORMAT)
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-observer = log.PythonLoggingObserver()
-observer.start()
+from configuration import ModLedConfiguration, ADDRESS, COUNT, ADDRESS_STREAM, ADDRESS_STREAM_COMMIT, CORRECTION, DEFAULTS
+from coalescer import WriteCoalescer, WINDOW
+from datastore import CachedSlaveContext, FLUSH_INTERVAL, read_registers
+from frameclock import FrameClock
+from framebuffer import Framebuffer
+from stream import StreamBuffer, STREAM_FPS
+from tracing import LatencyTracer
+from transition import Crossfader
+from snapshot import RenderSnapshot, resume_step
+import programs
+from metrics import MetricsCollector, INTERVAL as METRICS_INTERVAL
+from exporter import Histogram, RENDER_BUCKETS, FLUSH_BUCKETS
+import exporter
+
+# NOTE: the heavy modules (pymodbus, Twisted, SQLAlchemy and the ledstrip driver) are imported by the
+# code paths that need them. The ledstrip is lit with the last configuration before most of them are.
+
+def import_ledstrip():
+    """Import the ledstrip driver; returns whether the ledstrip can be driven."""
+    try:
+        importlib.import_module('ledstrip')
+    except Exception as e:
+        logger.info(f"Ledstrip control disabled: {e}")
+        return False
+    return True
 
-from signals.signals import Signal
-control_signal = Signal(providing_args=['address', 'value'])
+profile.mark('imports')
 
-ENABLE_LEDSTRIP=False
-try:
-    import ledstrip
-    from rpi_ws281x import *
-    ENABLE_LEDSTRIP=True
-except Exception as e:
-    logger.info(f"Ledstrip control disabled: {e}")
 
-class SingleLedstripControlRequest(WriteSingleRegisterRequest):
+class BaseModLedController(object):
+    """
+    The state that all controllers share: the configuration, the ledstrip, the render state
+    of the previous run and the counters for the metrics and the latency tracer. The controllers
+    differ in where the frames are rendered and how they are paced.
+    """
 
-    def __init__(self, address=None, **kwargs):
-        super(LedstripControlRequest, self).__init__(self, **kwargs)
-        self.address = address
-        self.count = 16
+    def __init__(self, configuration: {}, stream: StreamBuffer, disable_ledstrip=False, snapshot=None):
+        self._ledstrip_enabled = not disable_ledstrip
 
-    def execute(self, context):
-        result = super().execute(context)
+        self._configuration = None
+        self._stream = stream
+        self.ledstrip = None
 
-        if isinstance(result, ModbusResponse):
-            address = result.address
-            value = result.value
+        self._number_of_leds = configuration['number_of_leds']
+        self._pin = configuration['pin']
+        self._brightness = configuration['brightness']
+
+        self._on = False
+        self._program = None
+        self._correction = None
+
+        self._tracer = None
+        self.switches = 0 # the number of times the controller switched programs
+        self.first_shown = None # the time.perf_counter() at which the first frame was shown
+
+        # NOTE: the render state of the previous run, if any, is picked up where it was left
+        self._snapshot = snapshot
+        self._resumed = snapshot.read() if snapshot else None
+        self._resume = resume_step(self._resumed, configuration)
+
+    def _createLedstrip(self, group=None, channel=0):
+        """The ledstrip to show the frames on."""
+        if self._ledstrip_enabled:
+            # NOTE: the ledstrip driver is only imported when there's a ledstrip to drive
+            import ledstrip
+        if self._ledstrip_enabled and group:
+            # NOTE: the strip is one of the channels of a group, which renders all of its channels at once
+            return ledstrip.LedstripChannel(group, channel, self._number_of_leds, self._brightness)
+        if self._ledstrip_enabled:
+            return ledstrip.Ledstrip(
+                num=self._number_of_leds, # ledstrip.LED_COUNT
+                pin=self._pin, # ledstrip.LED_PIN
+                freq_hz=ledstrip.LED_FREQUENCE,
+                dma=ledstrip.LED_DMA,
+                invert=ledstrip.LED_INVERT,
+                brightness=self._brightness # ledstrip.LED_BRIGHTNESS
+            )
+        # NOTE: without a ledstrip, we still render the programs, but the frames go nowhere
+        return Framebuffer(self._number_of_leds, self._brightness)
 
-            logger.debug(f"Value {value} written at {address}") # NOTE: the address reported here should probably be incremented to properly reflect the value in get/set-values
+    def updateConfiguration(self, configuration: {}):
+        self._configuration = configuration
 
-            logger.debug('sending control_signal...')
+        self._on = configuration['on']
+        self._program = configuration['program']
 
-            control_signal.send_robust(sender=None, address=address, value=value)
+        # NOTE: the frames are corrected when they're shown; the correction is handed to the thread that shows them
+        # (see _correct), because replacing it invalidates what the ledstrip has shown, while it may be showing a frame
+        self._correction = tuple(configuration[field] for field in CORRECTION)
 
-            logger.debug('control_signal sent')
+    def getConfiguration(self):
+        return self._configuration
 
-        return result
+    def _correct(self):
+        """Apply the configured correction to the ledstrip, before showing a frame."""
+        self.ledstrip.setCorrection(*self._correction)
 
-class MultipleLedstripControlRequest(WriteMultipleRegistersRequest):
+    def setTracer(self, tracer):
+        self._tracer = tracer
 
-    def __init__(self, address=None, **kwargs):
-        super(MultipleLedstripControlRequest, self).__init__(self, **kwargs)
-        self.address = address
+    def _switched(self):
+        self.switches += 1
+        if self._tracer:
+            self._tracer.mark('switch')
 
-    def execute(self, context):
-        result = super().execute(context)
+    def _shown(self):
+        if self.first_shown is None:
+            self.first_shown = time.perf_counter()
+        if self._tracer:
+            self._tracer.shown()
 
-        if isinstance(result, ModbusResponse):
-            address = result.address
-            count = result.count
 
-            logger.debug(f"Written {count} values at {address}") # NOTE: the address reported here should probably be incremented to properly reflect the value in get/set-values
+class RenderingModLedController(BaseModLedController):
+    """
+    Renders the programs (see programs.py) a frame at a time, into the layers of a crossfader.
+    Changes in configuration are picked up between two frames. The subclasses only differ in
+    how they wait for notifications and frame deadlines; they create the wakeup event.
+    """
 
-            logger.debug('sending control_signal...')
+    def __init__(self, configuration: {}, stream: StreamBuffer, disable_ledstrip=False, group=None, channel=0, snapshot=None):
+        super(RenderingModLedController, self).__init__(configuration, stream, disable_ledstrip, snapshot)
 
-            control_signal.send_robust(sender=None, address=address, value=None)
+        self._has_bugun = False
+        self._state = 'off'
 
-            logger.debug('control_signal sent')
+        self._clock = FrameClock()
+        self._clock.histogram = self.histogram = Histogram(RENDER_BUCKETS)
 
-        return result
+        self.ledstrip = self._createLedstrip(group, channel)
+        self.ledstrip.clock = self._clock
 
-class LedstripSwitchException(Exception):
-    pass
+        # NOTE: the programs render into layers of the crossfader, which composes the frames of the ledstrip
+        self._crossfader = Crossfader(self.ledstrip)
 
-class ExceptionRaisingLedstripMock(object):
-    def __init__(self, queue: queue.Queue):
-        super(ExceptionRaisingLedstripMock, self).__init__()
-        self._queue = queue
+        self.updateConfiguration(configuration)
 
-    def show(self):
-        # NOTE: we're overriding the show() function as a natural break point during normal ledstrip operation
-        if not self._queue.empty():
-            value = self._queue.get()
-            logger.debug(f"Value: {value}")
-            logger.debug('raising LedstripSwitchException')
-            raise LedstripSwitchException()
+    def updateConfiguration(self, configuration: {}):
+        super(RenderingModLedController, self).updateConfiguration(configuration)
+        self._transition = configuration.get('transition', 0) / 1000
+
+        # NOTE: the running animation picks up the change at its next frame
+        self._crossfader.retune(configuration)
+
+    def notify(self):
+        """Wake up the controller; the program is switched before the next frame."""
+        self._wakeup.set()
+
+    def getStatistics(self):
+        return self._clock.statistics()
+
+    def resetMaximum(self):
+        self._clock.resetMaximum()
+
+    def _create(self, framebuffer):
+        """The current program, rendering into framebuffer."""
+        program = programs.create(self._program if self._on else 'off', framebuffer, self._configuration, self._stream)
+        if self._resume is not None:
+            # NOTE: the program of the previous run continues at the step it was at
+            program.step = self._resume
+            self._resume = None
+        return program
+
+    def _begin(self):
+        if self._ledstrip_enabled and not self._has_bugun:
+            self.ledstrip.begin()
+            self._has_bugun = True
+
+    def _showResumed(self):
+        """Show the last frame of the previous run right away; the first program crossfades from it."""
+        if not self._resumed:
+            return
+        self._begin()
+        # NOTE: when we're off now, the frame the previous run left on the strip is cleared instead
+        np.copyto(self.ledstrip.pixels, self._resumed['frame'] if self._on else 0)
+        self._correct()
+        self.ledstrip.show()
+        self._shown()
+
+    def _next(self):
+        """
+        The frame generator and fps to show next, switching programs when we were notified, or
+        (None, None) when the ledstrip is off and we should wait for a notification.
+        """
+        # NOTE: we're here because we were notified, or because a crossfade has ended. The event is only
+        # cleared when it was set, such that a notification arriving in between is not lost.
+        switched = False
+        if self._wakeup.is_set():
+            self._wakeup.clear()
+            switched = True
+            self._switched()
+
+        if not self._on and self._state == 'off':
+            # NOTE: when we should be off, we block until we're notified of a change; nothing is shown for the switch
+            if switched and self._tracer:
+                self._tracer.skipped()
+            return None, None
+
+        self._begin()
+
+        if switched or self._state == 'off':
+            # NOTE: turning off is a switch to a black frame, so the strip fades out too
+            self._crossfader.switch(self._create, self._transition)
+        self._state = 'on' if self._on else 'off'
+
+        frames, fps = self._crossfader.frames()
+        if fps:
+            self._clock.start(fps)
+        return frames, fps
+
+    def _show(self):
+        self._correct()
+        self.ledstrip.show()
+        self._shown()
+        if self._snapshot:
+            self._snapshot.update(self._configuration, self._crossfader.program.step, self.ledstrip.pixels)
+
+    def _save(self):
+        """Save the render state, such that the next run can resume from it."""
+        if self._snapshot and self._crossfader.program:
+            self._snapshot.write(self._configuration, self._crossfader.program.step, self.ledstrip.pixels)
+
+    def _leave(self):
+        """Leave the ledstrip when stopping."""
+        if self._snapshot:
+            # NOTE: the strip keeps showing the last frame, until the next run resumes from it
+            self._save()
+        else:
+            self.clear()
 
-        logger.debug('showing ledstrip')
+    def clear(self):
+        logger.debug('clearing ledstrip')
+        if self._ledstrip_enabled and self._has_bugun:
+            self.ledstrip.clear()
 
 
-class ModLedController(threading.Thread):
+class ModLedController(RenderingModLedController, threading.Thread):
+    """
+    Drives the ledstrip from a thread. The program renders a frame at a time (see programs.py)
+    and changes in configuration are picked up between two frames.
+    """
 
-    def __init__(self, configuration: {}, queue: queue.Queue, disable_ledstrip=False):
-        super(ModLedController, self).__init__()
+    def __init__(self, configuration: {}, stream: StreamBuffer, disable_ledstrip=False, group=None, channel=0, snapshot=None):
+        threading.Thread.__init__(self)
 
-        self._queue = queue
+        # NOTE: the wakeup event is set whenever the controller should (re)consider what to show
+        self._wakeup = threading.Event()
         self._stop_event = threading.Event()
-        self._ledstrip_enabled = not disable_ledstrip
 
-        self._configuration = None
+        RenderingModLedController.__init__(self, configuration, stream, disable_ledstrip, group, channel, snapshot)
 
-        self._number_of_leds = configuration['number_of_leds']
-        self._pin = configuration['pin']
-        self._brightness = configuration['brightness']
+    def run(self):
+        logger.debug('starting ledstrip')
+        logger.debug(f"Configuration: {self._configuration}")
+        self._showResumed()
+        while not self.stopped():
+            frames, fps = self._next()
+            if frames is None:
+                self._wakeup.wait()
+                continue
+
+            for _ in frames:
+                if self._wakeup.is_set():
+                    break
+                self._show()
+                if fps:
+                    # NOTE: a notification cuts the wait for the next frame short; after a missed deadline,
+                    # the animation steps past the frames that should have been shown, without rendering them
+                    self._crossfader.skip(self._clock.tick(self._wakeup) - 1)
+
+            if not fps:
+                # NOTE: a static frame does not change until we're notified
+                self._wakeup.wait()
 
-        self._on = False
-        self._program = None
-        self._color_tuple = None
+    def stop(self):
+        logger.debug('stopping ledstrip')
+        self._stop_event.set()
+        self._wakeup.set()
+        # NOTE: the thread is done with the ledstrip once it has seen the stop
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join()
+        self._leave()
 
-        self._has_bugun = False
-        self._state = 'off'
+    def stopped(self):
+        return self._stop_event.is_set()
 
-        self.updateConfiguration(configuration)
+    def reset(self):
+        logger.debug('resetting controller')
+        self._stop_event = threading.Event()
 
-        if self._ledstrip_enabled:
-            self.ledstrip = ledstrip.ExceptionRaisingLedstrip(
-                queue=self._queue,
-                num=self._number_of_leds, # ledstrip.LED_COUNT
-                pin=self._pin, # ledstrip.LED_PIN
-                freq_hz=ledstrip.LED_FREQUENCE,
-                dma=ledstrip.LED_DMA,
-                invert=ledstrip.LED_INVERT,
-                brightness=self._brightness # ledstrip.LED_BRIGHTNESS
-            )
-        else:
-            self.ledstrip = ExceptionRaisingLedstripMock(self._queue)
 
-    def updateConfiguration(self, configuration: {}):
-        self._configuration = configuration
-        
-        self._on = configuration['on']
-        self._program = configuration['program'] 
+class AsyncModLedController(RenderingModLedController):
+    """
+    Drives the ledstrip from a coroutine on the asyncio event loop. Like the ModLedController,
+    but frames are paced by the event loop and changes in configuration are awaited.
+    """
 
-        red, green, blue = configuration['red'], configuration['green'], configuration['blue']
-        self._color_tuple = (red, green, blue)
+    def __init__(self, configuration: {}, stream: StreamBuffer, disable_ledstrip=False, group=None, channel=0, snapshot=None):
+        import asyncio
 
-    def getConfiguration(self):
-        return self._configuration
+        self._wakeup = asyncio.Event()
+        self._stopped = False
+
+        super(AsyncModLedController, self).__init__(configuration, stream, disable_ledstrip, group, channel, snapshot)
+
+    async def run(self):
+        logger.debug('starting ledstrip')
+        logger.debug(f"Configuration: {self._configuration}")
+        self._showResumed()
+        while not self._stopped:
+            frames, fps = self._next()
+            if frames is None:
+                await self._wakeup.wait()
+                continue
+
+            for _ in frames:
+                if self._wakeup.is_set():
+                    break
+                self._show()
+                if fps:
+                    self._crossfader.skip(await self._clock.atick() - 1)
+
+            if not fps:
+                # NOTE: a static frame does not change until we're notified
+                await self._wakeup.wait()
+
+    def stop(self):
+        logger.debug('stopping ledstrip')
+        self._leave()
+        self._stopped = True
+        self._wakeup.set()
+
+
+class ProcessModLedController(BaseModLedController, threading.Thread):
+    """
+    Drives the ledstrip with frames rendered by a worker process (see renderer.py). The
+    worker renders into shared memory; this thread only shows the finished frames, so
+    rendering does not compete with the Modbus server for the GIL.
+    """
+
+    def __init__(self, configuration: {}, stream: StreamBuffer, disable_ledstrip=False, group=None, channel=0, snapshot=None):
+        threading.Thread.__init__(self)
+        BaseModLedController.__init__(self, configuration, stream, disable_ledstrip, snapshot)
+
+        import multiprocessing
+        import renderer
+
+        context = multiprocessing.get_context('spawn')
+
+        # NOTE: the ready event is set by the worker for every frame, and by notify()
+        self._ready = context.Event()
+        self._stop_event = threading.Event()
+
+        self._frames = renderer.SharedFrames(self._number_of_leds)
+        self._connection, connection = context.Pipe()
+        self._worker = context.Process(
+            target=renderer.render,
+            args=(self._frames.name, self._number_of_leds, connection, self._ready),
+            name='ModLedRenderer',
+            daemon=True
+        )
+        self._worker.start()
+
+        self._clock = FrameClock(STREAM_FPS)
+        self.histogram = None # NOTE: the frames are rendered by the worker
+        self._generation = 0
+
+        self.ledstrip = self._createLedstrip(group, channel)
+
+        if self._resumed and configuration['on']:
+            # NOTE: the worker crossfades from the frame shown on startup; it has to arrive before the configuration
+            self._connection.send(('resume', (self._resume, self._resumed['frame'])))
+
+        self.updateConfiguration(configuration)
+        self.notify()
+
+    def updateConfiguration(self, configuration: {}):
+        # NOTE: the frames are corrected by the server when they're shown, not by the worker
+        super(ProcessModLedController, self).updateConfiguration(configuration)
+        self._connection.send(('configure', configuration))
+
+    def getStatistics(self):
+        # NOTE: the frames are rendered and paced by the worker; streamed frames are picked up by this thread
+        statistics = self._frames.statistics()
+        if self._on and self._program == 'stream':
+            statistics['fps'] = self._clock.fps
+        return statistics
+
+    def resetMaximum(self):
+        self._frames.resetMaximum()
+
+    def _switched(self):
+        super(ProcessModLedController, self)._switched()
+        if self._tracer:
+            self._tracer.shown()
+
+    def notify(self):
+        """Make the worker start rendering the current configuration."""
+        # NOTE: the generation tells the frames rendered after this notification apart from the ones before it
+        self._generation += 1
+        self._connection.send(('notify', self._generation))
+        self._ready.set()
 
     def run(self):
         logger.debug('starting ledstrip')
         logger.debug(f"Configuration: {self._configuration}")
+        if self._ledstrip_enabled:
+            self.ledstrip.begin()
+        if self._resumed:
+            # NOTE: the last frame of the previous run is shown until the worker has rendered its first
+            self.ledstrip.pixels = self._resumed['frame'] if self._on else np.zeros(self._number_of_leds, dtype=np.uint32)
+            self._correct()
+            self.ledstrip.show()
+            self.first_shown = time.perf_counter()
+
+        sequence = None
+        streamed = None
+        shown = 0 # the generation of the frame shown last
         while not self.stopped():
-            should_check_state = False
-            if self._on:
-                if self._ledstrip_enabled:
-                    if not self._has_bugun:
-                        self.ledstrip.begin()
-                        self._has_bugun = True
-                    try:
-                        logger.debug('driving ledstrip') # TODO: this can be pretty verbose; can we filter out some of it?
-                        if self._program == 'rainbow':
-                            self.ledstrip.rainbow()
-                        elif self._program == 'rainbow_cycle':
-                            self.ledstrip.rainbowCycle(1)
-                        elif self._program == 'theater_chase':
-                            color = Color(self._color_tuple[0], self._color_tuple[1], self._color_tuple[2])
-                            self.ledstrip.theaterChase(color)
-                        elif self._program == 'theater_chase_rainbow':
-                            self.ledstrip.theaterChaseRainbow()
-                        elif self._program == 'strand_test':
-                            color = Color(self._color_tuple[0], self._color_tuple[1], self._color_tuple[2])
-                            self.ledstrip.theaterChase(color) # TODO: implement the actual strandtest
-                        else:
-                            color = Color(self._color_tuple[0], self._color_tuple[1], self._color_tuple[2])
-                            self.ledstrip.fill(color)
-                            time.sleep(1)
-                    except ledstrip.LedstripSwitchException as e:
-                        logger.debug(e)
-                        logger.debug('LedstripSwitchException handled')
-                        should_check_state = True
-                else:
-                    # NOTE: this implementation is provided for the sole purpose of simulating the ledstrip
-                    try:
-                        self.ledstrip.show()
-                        logger.debug(f"Program: {self._program}")
-                        if self._program == 'fixed':
-                            logger.debug(f"Colors: {self._color_tuple}")
-                        time.sleep(5) # TODO: this can be a bit verbose
-                    except LedstripSwitchException as e:
-                        logger.debug(e)
-                        logger.debug('LedstripSwitchException handled')
-                        should_check_state = True
-                    
-                # TODO: can we make this work with asyncio?
-            else:
-                # When we should be off, we'll sleep for a little while, to not seem too busy...
-                time.sleep(1)
-                should_check_state = True
-
-            if should_check_state:
-                if self._on:
-                    if self._state == 'off':
-                        # we should turn on
-                        self._state = 'on' # leds will go in next loop?
-                else:
-                    if self._state == 'on':
-                        self.clear()
-                        self._state = 'off'
+            if self._on and self._program == 'stream':
+                # NOTE: streamed frames need no rendering; they are shown straight from the stream buffer,
+                # which replaces its frame on every commit rather than changing it
+                if self._stream.sequence != streamed:
+                    streamed = self._stream.sequence
+                    self.ledstrip.pixels = self._stream.frame
+                    self._correct()
+                    self.ledstrip.show()
+                    self.first_shown = self.first_shown or time.perf_counter()
+                    if self._snapshot:
+                        self._snapshot.update(self._configuration, 0, self._stream.frame)
+                    if shown != self._generation:
+                        shown = self._generation
+                        self._switched()
+                self._ready.wait(self._clock.period)
+                self._ready.clear()
+                continue
+
+            streamed = None
+            self._ready.wait()
+            self._ready.clear()
+            current, frame = self._frames.read()
+            if current != sequence:
+                sequence = current
+                # NOTE: the ledstrip shows the frame in shared memory; there's no copy in between
+                self.ledstrip.pixels = frame
+                self._correct()
+                self.ledstrip.show()
+                self.first_shown = self.first_shown or time.perf_counter()
+                if self._snapshot:
+                    self._snapshot.update(self._configuration, self._frames.step(), frame)
+                # NOTE: the first frame rendered for the latest notification completes the switch
+                if shown != self._generation and self._frames.generation() == self._generation:
+                    shown = self._generation
+                    self._switched()
+            del frame
+
+        if self._snapshot:
+            # NOTE: the strip keeps showing the last frame, until the next run resumes from it
+            self._snapshot.write(self._configuration, self._frames.step(), self.ledstrip.pixels)
+        else:
+            self.clear()
+        import renderer
+        try:
+            self._connection.send(('stop', None))
+        except (BrokenPipeError, OSError):
+            # NOTE: the worker is gone already, e.g. when the process group got a SIGTERM
+            logger.debug('renderer stopped already')
+        finally:
+            self._worker.join(renderer.STOP_TIMEOUT)
+            if self._worker.is_alive():
+                logger.warning('renderer did not stop, terminating it')
+                self._worker.terminate()
+            self._frames.close()
 
     def clear(self):
         logger.debug('clearing ledstrip')
-        if self._ledstrip_enabled and hasattr(self, 'ledstrip') and self.ledstrip:
-            self.ledstrip.clear()
+        # NOTE: the ledstrip gets pixels of its own again, so clearing does not write into the shared frames
+        self.ledstrip.pixels = np.zeros(self._number_of_leds, dtype=np.uint32)
+        self.ledstrip.show()
 
     def stop(self):
         logger.debug('stopping ledstrip')
-        self.clear()
-        print(self.ledstrip.getPixels())
         self._stop_event.set()
+        self._ready.set()
 
     def stopped(self):
         return self._stop_event.is_set()
 
-    def reset(self):
-        logger.debug('resetting controller')
-        self._stop_event = threading.Event()
-
-
-class ModLedSqlSlaveContext(SqlSlaveContext):
-    def __init__(self, database='modled'):
-        table = database
-        database = f"sqlite:///{table}.sqlite3"
-        super(ModLedSqlSlaveContext, self).__init__(table=table, database=database)
-
-    def initialize(self, hr, force=False):
-        # NOTE: this function is currently hardcoded to work with Holding Registers only
-        logger.info('Initializing SQLite database')
-        number_of_existing_holding_registers = self._count('h')
-        if number_of_existing_holding_registers == 0:
-            logger.info(f"Initializing {self.database} with {hr}.")
-            address = hr.address
-            values = hr.values
-            # NOTE: this is rather naive, but it works for now; we can improve later
-            self._set('h', address, values)
-        else:
-            logger.info(f"{self.database} already contains {number_of_existing_holding_registers} register addresses.")
-
-    def _count(self, type):
-        count = select([func.count()]).select_from(self._table).where(self._table.c.type == type).scalar()
-        return count
 
+def table_name(database='modled', unit=1):
+    # NOTE: unit 1 uses the modled table, like before; the other units get a table of their own
+    return database if unit == 1 else f"{database}_{unit}"
 
-def run(host, port, database='modled', disable_ledstrip=False, debug=False):
 
-    if debug:
-        logger.setLevel(logging.DEBUG)
+def create_store(database='modled', flush_interval=FLUSH_INTERVAL, unit=1, store='sqlite'):
+    from pymodbus.datastore import ModbusSequentialDataBlock
+    # NOTE: the registers are stored in SQLite, or in a memory-mapped file with the array store
+    if store == 'array':
+        from arraystore import ModLedArraySlaveContext as SlaveContext
+    else:
+        from sqlstore import ModLedSqlSlaveContext as SlaveContext
 
     # store = ModbusSlaveContext(
     #     hr=ModbusSequentialDataBlock(0, [17]*10)
@@ -289,7 +538,9 @@ def run(host, port, database='modled', disable_ledstrip=False, debug=False):
     # The code for initialization seems a bit off, because the block values are NOT used for initialisation of the
     # SQLite database when the SqlSlaveContext is created. Perhaps this requires a bug fix in the _create_db function?
     # We should probably parse all the kwargs for blocks, these should be added by default.
-    block = ModbusSequentialDataBlock(1, [17]*10) # TODO: set some sensible defaults here
+    # NOTE: a new database starts with a fixed color; the registers added later (e.g. the color correction)
+    # have defaults that don't change what's shown
+    block = ModbusSequentialDataBlock(1, [DEFAULTS.get(address, 17) for address in range(ADDRESS, ADDRESS + COUNT)]) # TODO: set some sensible defaults here
     
     # NOTE: below we're defining our modled.sqlite3 database (on disk) and table (modled) that
     # pymodbus should use to write its values to. Initialisation of the ModbusSequentialDataBlock is
@@ -312,132 +563,308 @@ def run(host, port, database='modled', disable_ledstrip=False, debug=False):
     #  2) override _create_db function locally and make sure that we can parse the block (good)
     #  3) prefil the SQLite database, with the values we want when it does not exist (easiest?)
 
-    unit = 1 # NOTE: unit functions like an identifier for a slave
-    store = ModLedSqlSlaveContext(database=database)
-    store.initialize(hr=block) # NOTE: we're initializing with a block for Holding Registers only now.
-    context = ModbusServerContext(
-        slaves={unit: store}, # NOTE: Currently the SqlSlaveContext does not seem to support multiple slaves? How to distinguish?
-        single=False
-    )
+    slave_store = SlaveContext(database=database, table=table_name(database, unit))
+    slave_store.initialize(hr=block) # NOTE: we're initializing with a block for Holding Registers only now.
 
-    def determine_configuration():
-
-        function = 3 # read holding registers
-        address = 0
-        count = 10
-
-        values = context[unit].getValues(function, address, count)
-        logger.debug("Values from datastore: " + str(values))
-
-        a40001, a40002, a40003, a40004, a40005, a40006, a40007, a40008 = values[1:9] # take 8 values
-        on = (a40001 & 1 << 0 != 0) # zero'th bit
-        fixed = (a40001 & 1 << 1 != 0) # first bit set
-        rainbow = (a40001 & 1 << 2 != 0) # second bit set
-        strand_test = (a40001 & 1 << 3 != 0) # third bit set
-        red = a40002
-        green = a40003
-        blue = a40004
-        number_of_leds = a40005
-        brightness = a40006
-        pin = a40007
-
-        # TODO: programs to add: theaterChase, theaterChaseRainbow, rainbowCycle?
-        rainbow_cycle = False
-        theater_chase = False
-        theater_chase_rainbow = False
-
-        program = None
-        if fixed:
-            program = 'fixed'
-        if rainbow:
-            program = 'rainbow'
-        if strand_test:
-            program = 'strand_test'
-        if rainbow_cycle:
-            program = 'rainbow_cycle'
-        if theater_chase:
-            program = 'theater_chase'
-        if theater_chase_rainbow:
-            program = 'theater_chase_rainbow'
-        if not program:
-            program = 'fixed' # TODO: decide whether we should go off instead in case no program determined?
-
-        configuration = {
-            'on': on,
-            'red': red,
-            'green': green,
-            'blue': blue,
-            'number_of_leds': number_of_leds,
-            'brightness': brightness,
-            'pin': pin,
-            'program': program
-        }
-        
-        return configuration
-
-    configuration = determine_configuration()
-    
-    # NOTE: initializing the Modbus server identification
-    identity = ModbusDeviceIdentification()
-    identity.VendorName = 'hslatman'
-    identity.ProductCode = 'MLS'
-    identity.VendorUrl = 'https://github.com/hslatman/modled'
-    identity.ProductName = 'ModLed Server'
-    identity.ModelName = 'ModLed X'
-    identity.MajorMinorRevision = '0.1.0'
-
-    signal_queue = queue.Queue()
-    controller = ModLedController(configuration=configuration, queue=signal_queue, disable_ledstrip=disable_ledstrip)
-    controller.start()
+    # NOTE: the Modbus server reads and writes an in-memory copy of the registers; writes
+    # are flushed to the store in the background every flush_interval seconds and on shutdown.
+    store = CachedSlaveContext(slave_store, flush_interval=flush_interval)
+    store.histogram = Histogram(FLUSH_BUCKETS)
+    store.start()
+
+    return store
+
+
+def create_apply(configuration, controller, tracer=None):
+
+    def apply(writes):
 
-    def handler(sender, **kwargs):
-        
-        # TODO: do something with the address and value in kwargs
         # TODO: determine whether a reset of the ledstrip is required? e.g. first a clear, for some programs?
-        # TODO: restart the controller process
 
-        new_configuration = determine_configuration()
-        old_configuration = controller.getConfiguration()
+        if tracer:
+            tracer.mark('apply')
+
+        changed = set()
+        for address, values in writes:
+            changed |= configuration.update(address, values)
+
+        logger.debug(f"Changed: {changed}")
+        logger.debug(f"New configuration: {configuration}")
+
+        if not changed:
+            if tracer:
+                tracer.discard()
+            return
 
-        logger.debug(f"Old configuration: {old_configuration}")
-        logger.debug(f"New configuration: {new_configuration}")
-        
         should_signal = False
-        if new_configuration['on'] != old_configuration['on']:
+        if 'on' in changed:
             should_signal = True
-        if new_configuration['program'] != old_configuration['program']:
+        if 'program' in changed:
             should_signal = True
-        if new_configuration['program'] == 'fixed':
-            if new_configuration['red'] != old_configuration['red']:
-                should_signal = True
-            if new_configuration['green'] != old_configuration['green']:
+        if configuration.program == 'fixed':
+            if changed & {'red', 'green', 'blue'}:
                 should_signal = True
-            if new_configuration['blue'] != old_configuration['blue']:
+            # NOTE: animations show the new correction with their next frame; a fixed color is shown again
+            if changed & set(CORRECTION):
                 should_signal = True
 
         # TODO: additional logic for signaling for the other programs to add
 
-        program = new_configuration['program']
+        program = configuration.program
         logger.debug(f"program to run next: {program}")
 
-        controller.updateConfiguration(new_configuration) # NOTE: we're writing value to a thread, but it's pretty safe to do so at this point
+        controller.updateConfiguration(configuration.asDict()) # NOTE: we're writing value to a thread, but it's pretty safe to do so at this point
 
         logger.debug(f"Should signal: {should_signal}")
         if should_signal:
-            logger.debug('signaling to trigger an exception')
-            value = {'address': kwargs['address'], 'value': kwargs['value']}
-            signal_queue.put(value)
+            logger.debug('notifying the controller')
+            if tracer:
+                tracer.mark('notify')
+            controller.notify()
+        elif tracer:
+            tracer.discard()
+
+    return apply
 
-    control_signal.connect(handler)
+
+def create_handler(coalescer, stream, tracer=None):
+
+    def handler(sender, **kwargs):
+        address = kwargs['address']
+        values = kwargs['values']
+
+        # NOTE: streamed pixels bypass the coalescer; they go into the stream buffer right away
+        if address >= ADDRESS_STREAM:
+            stream.write(address - ADDRESS_STREAM, values)
+            return
+
+        if tracer:
+            tracer.begin(kwargs.get('received'))
+
+        if address <= ADDRESS_STREAM_COMMIT < address + len(values):
+            stream.commit()
+
+        coalescer.add(address, values)
+
+    return handler
+
+
+class ModLedUnit(object):
+    """
+    Everything that belongs to a single unit (slave): its registers, the configuration decoded
+    from them, the stream buffer and the controller for its ledstrip.
+    """
+
+    def __init__(self, unit, database='modled', flush_interval=FLUSH_INTERVAL, store='sqlite'):
+        self.unit = unit
+        self.store = None
+        self._database = database
+        self._flush_interval = flush_interval
+        self._store = store
+
+        # NOTE: the last configuration is read straight from the database, such that the ledstrip can be lit
+        # before the store is opened. The first time, there's none until the store has initialized the database.
+        table = table_name(database, unit)
+        registers = None
+        if store == 'array':
+            import arraystore
+            registers = arraystore.read_registers(database, table)
+        if registers is None:
+            # NOTE: an array store that doesn't exist yet is migrated from the SQLite database when it's opened
+            registers = read_registers(database, table)
+        self.configuration = ModLedConfiguration.fromRegisters(registers) if registers else None
+        logger.debug(f"Configuration of unit {unit} from database: {self.configuration}")
+
+        # NOTE: the pixels for the stream program are kept in memory only
+        self.stream = StreamBuffer(self.configuration.number_of_leds) if self.configuration else None
+
+        # NOTE: traces the latency of the writes from the Modbus request up to the ledstrip
+        self.tracer = LatencyTracer()
+
+        self.controller = None
+        self.coalescer = None
+        self.metrics = None
+        self.snapshot = None
+        self._handler = None
+
+    def openSnapshot(self):
+        """Open the render snapshot of the unit, for warm restarts of its ledstrip."""
+        self.snapshot = RenderSnapshot(f"{table_name(self._database, self.unit)}.state", self.configuration.number_of_leds)
+        return self.snapshot
+
+    def open(self):
+        """Open the store with the registers of the unit."""
+        self.store = create_store(database=self._database, flush_interval=self._flush_interval, unit=self.unit, store=self._store)
+
+        if self.configuration is None:
+            # NOTE: the holding registers are decoded once here; after that, the handler only decodes
+            # the fields that are covered by the addresses that were written.
+            self.configuration = ModLedConfiguration.fromStore(self.store)
+            logger.debug(f"Configuration of unit {self.unit} from datastore: {self.configuration}")
+            self.stream = StreamBuffer(self.configuration.number_of_leds)
+
+        self.store.addVolatile('h', ADDRESS_STREAM, len(self.stream))
+
+    def connect(self, controller, coalesce_window=WINDOW, call_later=None):
+        """Route the writes to the registers of this unit to its controller."""
+        self.controller = controller
+        controller.setTracer(self.tracer)
+        # NOTE: writes arriving within coalesce_window seconds are applied as a single configuration
+        # update, such that a burst of writes results in (at most) a single program switch.
+        self.coalescer = WriteCoalescer(create_apply(self.configuration, controller, self.tracer), window=coalesce_window, call_later=call_later)
+        # NOTE: the signal holds a weak reference to the handler; the unit keeps it alive
+        self._handler = create_handler(self.coalescer, self.stream, self.tracer)
+        import modbus
+        modbus.control_signal.connect(self._handler, sender=self.store)
+
+        # NOTE: the metrics are published in the input registers of the unit
+        self.metrics = MetricsCollector(self)
+
+    def close(self):
+        if self.coalescer:
+            self.coalescer.cancel()
+        if self.controller:
+            self.controller.stop()
+            if isinstance(self.controller, threading.Thread):
+                self.controller.join()
+        if self.store:
+            self.store.close()
+        if self.snapshot:
+            self.snapshot.close()
+
+
+def log_latencies(units):
+    """Log the latency summary of every unit; the servers do this on SIGUSR1."""
+    for unit in units:
+        summary = unit.tracer.summary()
+        logger.info(f"Latency of unit {unit.unit} (in flight: {unit.tracer.pending()}):")
+        for stage, latency in summary.items():
+            logger.info(f"  {stage:<8} {latency}")
+
+
+def update_metrics(units):
+    for unit in units:
+        try:
+            unit.metrics.update()
+        except Exception as e:
+            logger.error(f"Updating the metrics of unit {unit.unit} failed: {e}")
+
+
+def create_units(units, database='modled', flush_interval=FLUSH_INTERVAL, store='sqlite'):
+    units = [ModLedUnit(unit, database=database, flush_interval=flush_interval, store=store) for unit in units]
+    return units, open_units(units)
+
+
+def open_units(units):
+    """Open the stores of the units that aren't open yet and return the Modbus server context for them."""
+    from pymodbus.datastore import ModbusServerContext
+
+    for unit in units:
+        if unit.store is None:
+            unit.open()
+
+    return ModbusServerContext(
+        slaves={unit.unit: unit.store for unit in units},
+        single=False
+    )
+
+
+def import_store(store='sqlite'):
+    """Import the module of the store, which takes a while for the SQLite store (SQLAlchemy)."""
+    importlib.import_module('arraystore' if store == 'array' else 'sqlstore')
+
+
+def report_startup(units):
+    """Log the startup profile, including when every unit showed its first frame."""
+    for unit in units:
+        if unit.controller and unit.controller.first_shown:
+            profile.event(f"lights on (unit {unit.unit})", unit.controller.first_shown)
+    logger.info('Startup:')
+    for line in profile.report():
+        logger.info(f"  {line}")
+
+
+def create_group(units, disable_ledstrip=False):
+    """
+    With more than one unit, the ledstrips are driven as the channels of a single group, such
+    that the channels are refreshed together, in the same frame tick. A single unit drives its
+    ledstrip directly, like before.
+    """
+    if disable_ledstrip or len(units) < 2:
+        return None
+    import ledstrip
+    strips = [(unit.configuration.number_of_leds, unit.configuration.pin, unit.configuration.brightness) for unit in units]
+    return ledstrip.LedstripGroup(strips)
+
+
+def run(host, port, database='modled', units=(1,), flush_interval=FLUSH_INTERVAL, coalesce_window=WINDOW, disable_ledstrip=False, render_process=False, http=None, debug=False, profile_startup=False, snapshots=True, store='sqlite'):
+
+    if debug:
+        logger.setLevel(logging.DEBUG)
+
+    # NOTE: unit functions like an identifier for a slave; every unit has its own registers and ledstrip
+    units = [ModLedUnit(unit, database=database, flush_interval=flush_interval, store=store) for unit in units]
+    profile.mark('configuration')
+
+    # NOTE: a new database has no configuration yet; its store is opened (and initialized) right away
+    if any(unit.configuration is None for unit in units):
+        open_units(units)
+
+    group = create_group(units, disable_ledstrip=disable_ledstrip)
+
+    # NOTE: with render_process, the programs are rendered in a worker process per unit
+    controller_class = ProcessModLedController if render_process else ModLedController
+    controllers = []
+    for channel, unit in enumerate(units):
+        controller = controller_class(configuration=unit.configuration.asDict(), stream=unit.stream, disable_ledstrip=disable_ledstrip, group=group, channel=channel,
+            snapshot=unit.openSnapshot() if snapshots else None)
+        controller.start()
+        controllers.append(controller)
+    profile.mark('ledstrip')
+
+    # NOTE: the ledstrip is lit before Twisted, pymodbus and SQLAlchemy are imported
+    from twisted.internet import reactor, task
+    from twisted.python import log
+    from pymodbus.server.asynchronous import StartTcpServer
+    import modbus
+    profile.mark('modbus imports')
+
+    import_store(store)
+    profile.mark('store imports')
+
+    # NOTE: routing the Twisted logs into Python logging
+    log.PythonLoggingObserver().start()
+
+    context = open_units(units)
+    profile.mark('store')
+
+    for unit, controller in zip(units, controllers):
+        # NOTE: the coalescer flushes on the reactor, so the configuration is only ever touched by the reactor.
+        unit.connect(controller, coalesce_window=coalesce_window, call_later=reactor.callLater)
 
     # NOTE: starting the server with custom LedstripControlRequest
     StartTcpServer(
         context, 
-        identity=identity, 
+        identity=modbus.create_identity(), 
         address=(host, port),
-        custom_functions=[SingleLedstripControlRequest, MultipleLedstripControlRequest],
+        custom_functions=modbus.CUSTOM_FUNCTIONS,
         defer_reactor_run=True
     )
+    profile.mark('modbus server')
+
+    # NOTE: refreshing the metrics in the input registers on the reactor, such that reads are plain lookups
+    metrics_loop = task.LoopingCall(update_metrics, units)
+    metrics_loop.start(METRICS_INTERVAL, now=False)
+
+    # NOTE: optionally serving metrics and the configuration over HTTP on the same reactor; a scrape
+    # runs on the reactor, like the Modbus requests, and does not wait for the render threads
+    if http:
+        http_host, http_port = http
+        exporter.listen(http_host, http_port, units, modbus.request_histograms, modbus.signal_histogram)
+        logger.info(f"Serving metrics on http://{http_host}:{http_port}/metrics")
+
+    if profile_startup:
+        reactor.callWhenRunning(report_startup, units)
 
     # NOTE: registering an additional looping task on the Twisted reactor
     # TODO: look into https://github.com/riptideio/pymodbus/blob/master/examples/common/dbstore_update_server.py
@@ -450,43 +877,151 @@ def run(host, port, database='modled', disable_ledstrip=False, debug=False):
     # controller_loop = task.LoopingCall(controller.loop)
     # controller_loop.start(5.0)
 
-    def log_sigint(event):
-        if event.get("log_text") == 'Received SIGINT, shutting down.':
-            logger.debug("Stopping for: ", event)
-            controller.stop()
-            controller.join()
-            # if reactor.running:
-            #     reactor.stop()
+    def shutdown():
+        logger.debug('stopping')
+        for unit in units:
+            unit.close()
+        if group:
+            group.stop()
+
+    # NOTE: when the reactor stops (e.g. on SIGINT or SIGTERM), the pending writes are flushed and the controllers stopped
+    reactor.addSystemEventTrigger('before', 'shutdown', shutdown)
 
-    # NOTE: we're adding an observer that checks for SIGINT; we can then stop the controller properly
-    log.addObserver(log_sigint)
+    # NOTE: `kill -USR1 <pid>` logs the write to light latencies, without restarting the server
+    signal.signal(signal.SIGUSR1, lambda signum, frame: reactor.callFromThread(log_latencies, units))
 
     # NOTE: starting the Twisted reactor
     logger.debug('starting server')
     reactor.run()
 
 
+
+def run_asyncio(host, port, database='modled', units=(1,), flush_interval=FLUSH_INTERVAL, coalesce_window=WINDOW, disable_ledstrip=False, debug=False, profile_startup=False, snapshots=True, store='sqlite'):
+
+    # NOTE: an alternative to run(); the Modbus server and the ledstrip rendering both run as
+    # coroutines on a single asyncio event loop, instead of on the Twisted reactor and in a thread.
+    import asyncio
+
+    if debug:
+        logger.setLevel(logging.DEBUG)
+
+    units = [ModLedUnit(unit, database=database, flush_interval=flush_interval, store=store) for unit in units]
+    profile.mark('configuration')
+
+    if any(unit.configuration is None for unit in units):
+        open_units(units)
+
+    group = create_group(units, disable_ledstrip=disable_ledstrip)
+
+    async def serve():
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGUSR1, log_latencies, units)
+
+        controllers = []
+        tasks = []
+        for channel, unit in enumerate(units):
+            controller = AsyncModLedController(configuration=unit.configuration.asDict(), stream=unit.stream, disable_ledstrip=disable_ledstrip, group=group, channel=channel,
+                snapshot=unit.openSnapshot() if snapshots else None)
+            controllers.append(controller)
+            tasks.append(asyncio.ensure_future(controller.run()))
+        # NOTE: yielding once, such that the controllers show their first frame before the imports below
+        await asyncio.sleep(0)
+        profile.mark('ledstrip')
+
+        from pymodbus.server.async_io import StartTcpServer as StartAsyncTcpServer
+        import modbus
+        profile.mark('modbus imports')
+
+        import_store(store)
+        profile.mark('store imports')
+
+        context = open_units(units)
+        profile.mark('store')
+
+        for unit, controller in zip(units, controllers):
+            # NOTE: requests are executed on the event loop, so the coalescer can flush on it too
+            unit.connect(controller, coalesce_window=coalesce_window, call_later=loop.call_later)
+
+        server = await StartAsyncTcpServer(
+            context,
+            identity=modbus.create_identity(),
+            address=(host, port),
+            custom_functions=modbus.CUSTOM_FUNCTIONS,
+            defer_start=True
+        )
+        profile.mark('modbus server')
+
+        if profile_startup:
+            report_startup(units)
+
+        async def refresh_metrics():
+            while True:
+                await asyncio.sleep(METRICS_INTERVAL)
+                update_metrics(units)
+
+        logger.debug('starting server')
+        try:
+            await asyncio.gather(server.serve_forever(), refresh_metrics(), *tasks)
+        finally:
+            for unit in units:
+                unit.close()
+            if group:
+                group.stop()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        logger.debug('stopped')
+
+
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description='ModLed X Controller.')
     parser.add_argument('-H', '--host', nargs='?', type=str, default='127.0.0.1', help='The Modbus server host (hostname / IP)')
     parser.add_argument('-P', '--port', nargs='?', type=int, default=502, help='The Modbus server port number')
     parser.add_argument('-D', '--database', nargs='?', type=str, default='modled', help='The datatabase file (prefix) to use')
+    parser.add_argument('-U', '--units', nargs='+', type=int, default=[1], help='The Modbus units (slaves) to serve; with two units, their ledstrips are driven on PWM channel 0 and 1. At most 2 units, unless the ledstrip is disabled')
+    parser.add_argument('--store', choices=['sqlite', 'array'], default='sqlite', help='Store the registers in SQLite or in a memory-mapped file; an array store is migrated from the SQLite database the first time')
+    parser.add_argument('-F', '--flush-interval', nargs='?', type=float, default=FLUSH_INTERVAL, help='The interval (in seconds) for writing register changes to the database')
+    parser.add_argument('-C', '--coalesce-window', nargs='?', type=float, default=WINDOW, help='The window (in seconds) in which writes are combined into a single update')
+    parser.add_argument('-A', '--asyncio', action='store_true', help='Run the Modbus server and the ledstrip on an asyncio event loop instead of Twisted')
+    parser.add_argument('-R', '--render-process', action='store_true', help='Render the ledstrip programs in a separate process (not with --asyncio)')
+    parser.add_argument('--http-port', type=int, default=None, help='Serve metrics (/metrics) and the configuration (/configuration) over HTTP on this port (not with --asyncio)')
+    parser.add_argument('--http-host', type=str, default='127.0.0.1', help='The host (hostname / IP) to serve HTTP on')
     parser.add_argument('-DL', '--disable-ledstrip', action='store_true', help='Disable the ledstrip operation (for debugging)')
+    parser.add_argument('--no-snapshot', action='store_true', help='Do not save the render state for warm restarts; the ledstrip is cleared when stopping')
+    parser.add_argument('--profile-startup', action='store_true', help='Log the time spent in every step of the startup, up to the first frame shown')
     parser.add_argument('--debug', action='store_true', help='Whether to show debug logs')
     
     args = parser.parse_args()
+    profile.mark('arguments')
 
     host = args.host
     port = args.port
     database = args.database
+    units = args.units
+    flush_interval = args.flush_interval
+    coalesce_window = args.coalesce_window
     debug = args.debug
 
     # NOTE: in case we can't load the required library, or when explicitly set, we'll disable driving the ledstrip
-    disable_ledstrip = args.disable_ledstrip or not ENABLE_LEDSTRIP
+    disable_ledstrip = args.disable_ledstrip or not import_ledstrip()
+
+    # NOTE: the ledstrips of the units are the PWM channels of a single ws281x device (see create_group)
+    if not disable_ledstrip and len(units) > 2:
+        parser.error(f"at most 2 units can drive a ledstrip, not {len(units)}; use --disable-ledstrip to serve more units")
+    if args.asyncio and args.render_process:
+        parser.error('--render-process can not be combined with --asyncio')
+    if args.asyncio and args.http_port:
+        parser.error('--http-port can not be combined with --asyncio')
+
+    http = (args.http_host, args.http_port) if args.http_port else None
 
     try:
-        run(host, port, database=database, disable_ledstrip=disable_ledstrip, debug=debug)
+        if args.asyncio:
+            run_asyncio(host, port, database=database, units=units, flush_interval=flush_interval, coalesce_window=coalesce_window, disable_ledstrip=disable_ledstrip, debug=debug, profile_startup=args.profile_startup, snapshots=not args.no_snapshot, store=args.store)
+        else:
+            run(host, port, database=database, units=units, flush_interval=flush_interval, coalesce_window=coalesce_window, disable_ledstrip=disable_ledstrip, render_process=args.render_process, http=http, debug=debug, profile_startup=args.profile_startup, snapshots=not args.no_snapshot, store=args.store)
     except Exception as e:
         logger.error(e)
     
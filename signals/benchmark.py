@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""
+Signal benchmarks - the cost of dispatching a signal
+
+Measures the time per send_robust() for the dispatch modes of Signal (the default,
+use_caching and use_snapshot), with a receiver per sender for a number of senders,
+like the control_signal with a handler per unit. Every mode is measured from a
+single thread and from several threads sending at the same time, where the default
+mode contends for the lock of the signal.
+
+Run from the root of the repository:
+
+    python -m signals.benchmark
+"""
+
+import argparse
+import json
+import threading
+import time
+
+from signals.signals import Signal
+
+SENDS = 100000
+SENDERS = [1, 4, 16]
+THREADS = [1, 4]
+MODES = {
+    'default': {},
+    'caching': {'use_caching': True},
+    'snapshot': {'use_snapshot': True}
+}
+
+
+class Sender(object):
+    """A weak referenceable sender, like the slave context of a unit."""
+
+
+def benchmark_mode(mode, senders, threads, sends=SENDS):
+    signal = Signal(providing_args=['address', 'values'], **MODES[mode])
+
+    # NOTE: the signal holds weak references to the receivers; they're kept alive here
+    handlers = []
+    contexts = [Sender() for _ in range(senders)]
+    for context in contexts:
+        def handler(sender, **kwargs):
+            return None
+        handlers.append(handler)
+        signal.connect(handler, sender=context)
+
+    per_thread = sends // threads
+    barrier = threading.Barrier(threads + 1)
+
+    def send(context):
+        barrier.wait()
+        for _ in range(per_thread):
+            signal.send_robust(sender=context, address=1, values=[1])
+
+    workers = [threading.Thread(target=send, args=(contexts[index % senders],)) for index in range(threads)]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        'mode': mode,
+        'senders': senders,
+        'threads': threads,
+        'sends': per_thread * threads,
+        'ns_per_send': elapsed / (per_thread * threads) * 1e9
+    }
+
+
+def benchmark(sends=SENDS, senders=SENDERS, threads=THREADS, modes=MODES):
+    return [
+        benchmark_mode(mode, count, thread_count, sends)
+        for mode in modes for count in senders for thread_count in threads
+    ]
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Signal dispatch benchmarks.')
+    parser.add_argument('-N', '--sends', type=int, default=SENDS, help='The number of sends per measurement')
+    parser.add_argument('-S', '--senders', nargs='+', type=int, default=SENDERS, help='The numbers of senders (with a receiver each) to measure')
+    parser.add_argument('-T', '--threads', nargs='+', type=int, default=THREADS, help='The numbers of threads sending at the same time to measure')
+    parser.add_argument('-M', '--modes', nargs='+', choices=list(MODES), default=list(MODES), help='The dispatch modes to measure')
+
+    args = parser.parse_args()
+
+    print(json.dumps(benchmark(sends=args.sends, senders=args.senders, threads=args.threads, modes=args.modes), indent=2))
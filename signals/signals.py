@@ -2,6 +2,7 @@
 # The required dependencies from the django/signals repository and unnecessary
 # dependencies have been copied verbatim or removed from this file.
 
+import inspect
 import threading
 import weakref
 
@@ -30,11 +31,14 @@ class Signal:
         receivers
             { receiverkey (id) : weakref(receiver) }
     """
-    def __init__(self, providing_args=None, use_caching=False):
+    def __init__(self, providing_args=None, use_caching=False, use_snapshot=False):
         """
         Create a new signal.
         providing_args
             A list of the arguments this signal can pass along in a send() call.
+        use_snapshot
+            Dispatch from an immutable snapshot of the receivers per sender,
+            which is read without taking the lock on send().
         """
         self.receivers = []
         if providing_args is None:
@@ -49,6 +53,11 @@ class Signal:
         # .disconnect() is called and populated on send().
         self.sender_receivers_cache = weakref.WeakKeyDictionary() if use_caching else {}
         self._dead_receivers = False
+        # NOTE: with use_snapshot, the snapshot is rebuilt when receivers are connected or
+        # disconnected and after receivers were garbage collected. It is replaced, never
+        # changed, so send() can use it without holding self.lock.
+        self.use_snapshot = use_snapshot
+        self._snapshot = None
 
     def connect(self, receiver, sender=None, weak=True, dispatch_uid=None):
         """
@@ -82,19 +91,19 @@ class Signal:
 
         if weak:
             ref = weakref.ref
-            receiver_object = receiver
             # Check for bound methods
             if hasattr(receiver, '__self__') and hasattr(receiver, '__func__'):
                 ref = weakref.WeakMethod
-                receiver_object = receiver.__self__
-            receiver = ref(receiver)
-            weakref.finalize(receiver_object, self._remove_receiver)
+            # NOTE: the callback of the weak reference marks the receivers as dead; unlike a
+            # weakref.finalize, it goes away with the reference when the receiver is disconnected
+            receiver = ref(receiver, self._remove_receiver)
 
         with self.lock:
             self._clear_dead_receivers()
             if not any(r_key == lookup_key for r_key, _ in self.receivers):
                 self.receivers.append((lookup_key, receiver))
             self.sender_receivers_cache.clear()
+            self._rebuild_snapshot()
 
     def disconnect(self, receiver=None, sender=None, dispatch_uid=None):
         """
@@ -125,6 +134,7 @@ class Signal:
                     del self.receivers[index]
                     break
             self.sender_receivers_cache.clear()
+            self._rebuild_snapshot()
         return disconnected
 
     def has_listeners(self, sender=None):
@@ -143,6 +153,12 @@ class Signal:
                 Named arguments which will be passed to receivers.
         Return a list of tuple pairs [(receiver, response), ... ].
         """
+        if self.use_snapshot:
+            return [
+                (receiver, receiver(signal=self, sender=sender, **named))
+                for receiver in self._snapshot_receivers(sender)
+            ]
+
         if not self.receivers or self.sender_receivers_cache.get(sender) is NO_RECEIVERS:
             return []
 
@@ -167,13 +183,17 @@ class Signal:
         If any receiver raises an error (specifically any subclass of
         Exception), return the error instance as the result for that receiver.
         """
-        if not self.receivers or self.sender_receivers_cache.get(sender) is NO_RECEIVERS:
+        if self.use_snapshot:
+            receivers = self._snapshot_receivers(sender)
+        elif not self.receivers or self.sender_receivers_cache.get(sender) is NO_RECEIVERS:
             return []
+        else:
+            receivers = self._live_receivers(sender)
 
         # Call each receiver with whatever arguments it can accept.
         # Return a list of tuple pairs [(receiver, response), ... ].
         responses = []
-        for receiver in self._live_receivers(sender):
+        for receiver in receivers:
             try:
                 response = receiver(signal=self, sender=sender, **named)
             except Exception as err:
@@ -191,6 +211,41 @@ class Signal:
                 if not(isinstance(r[1], weakref.ReferenceType) and r[1]() is None)
             ]
 
+    def _rebuild_snapshot(self):
+        # Note: caller is assumed to hold self.lock.
+        if not self.use_snapshot:
+            return
+        anyone = tuple(receiver for (_, r_senderkey), receiver in self.receivers if r_senderkey == NONE_ID)
+        receivers = {}
+        for (_, senderkey), _ in self.receivers:
+            if senderkey != NONE_ID and senderkey not in receivers:
+                receivers[senderkey] = tuple(
+                    receiver for (_, r_senderkey), receiver in self.receivers
+                    if r_senderkey == NONE_ID or r_senderkey == senderkey
+                )
+        self._snapshot = (receivers, anyone)
+
+    def _snapshot_receivers(self, sender):
+        """
+        The live receivers for sender from the snapshot. Only takes self.lock
+        to rebuild the snapshot after receivers were garbage collected.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self.lock:
+                self._clear_dead_receivers()
+                self._rebuild_snapshot()
+                snapshot = self._snapshot
+        receivers, anyone = snapshot
+        live = []
+        for receiver in receivers.get(_make_id(sender), anyone):
+            if isinstance(receiver, weakref.ReferenceType):
+                receiver = receiver()
+                if receiver is None:
+                    continue
+            live.append(receiver)
+        return live
+
     def _live_receivers(self, sender):
         """
         Filter sequence of receivers to get resolved, live receivers.
@@ -237,6 +292,8 @@ class Signal:
         # collection, and so the call can happen while we are already holding
         # self.lock.
         self._dead_receivers = True
+        # NOTE: dropping the snapshot is safe without the lock; the next send() rebuilds it
+        self._snapshot = None
 
 
 def receiver(signal, **kwargs):
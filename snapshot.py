@@ -0,0 +1,117 @@
+"""
+Render snapshots - warm restarts of the ledstrip
+
+A controller periodically writes its render state to a small memory-mapped file:
+the configuration (program and parameters), the phase (step) of the animation and
+the last frame shown. When the server starts again, the last frame is shown right
+away and the program picks up at the saved phase, before the Modbus server and
+the datastore are started. The strip is not cleared when the server stops, so a
+restart doesn't show on the strip.
+
+The file is written through the page cache; it survives the process, not a power cut.
+"""
+
+import json
+import mmap
+import os
+import time
+
+import numpy as np
+
+INTERVAL = 1.0 # seconds
+
+# NOTE: the header holds int64 values: the version of the layout, a sequence number that is odd
+# while the snapshot is written, the time it was written (in ns), the step and the length of the
+# configuration (as JSON). The configuration and then the frame follow the header.
+VERSION = 1
+HEADER = 5
+CONFIGURATION_SIZE = 1024 # bytes
+
+
+class RenderSnapshot(object):
+    """
+    The render state of a ledstrip of num pixels in the file at path. A file
+    for a strip of another length is started anew, as it can't be resumed.
+    """
+
+    def __init__(self, path, num, interval=INTERVAL):
+        size = HEADER * 8 + CONFIGURATION_SIZE + num * 4
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != size:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        self._header = np.ndarray(HEADER, dtype=np.int64, buffer=self._map)
+        self._configuration = np.ndarray(CONFIGURATION_SIZE, dtype=np.uint8, buffer=self._map, offset=HEADER * 8)
+        self._frame = np.ndarray(num, dtype=np.uint32, buffer=self._map, offset=HEADER * 8 + CONFIGURATION_SIZE)
+
+        self.path = path
+        self.interval = interval
+        self._due = 0.0
+        self._written = None # the configuration written last, which is only encoded again when it changes
+
+    def read(self):
+        """
+        The saved render state as a dictionary with the configuration, the step and (a copy of) the
+        frame, or None when there's none, e.g. when the server stopped halfway writing it.
+        """
+        sequence = int(self._header[1])
+        if self._header[0] != VERSION or sequence == 0 or sequence & 1:
+            return None
+        try:
+            configuration = json.loads(self._configuration[:int(self._header[4])].tobytes())
+        except ValueError:
+            return None
+        return {
+            'configuration': configuration,
+            'step': int(self._header[3]),
+            'frame': self._frame.copy(),
+            'saved': int(self._header[2]) / 1e9
+        }
+
+    def write(self, configuration, step, pixels):
+        """Save the render state: the configuration, the step of its program and the frame shown."""
+        # NOTE: the sequence is made odd rather than incremented, such that it's even again after this write,
+        # also when a previous write was cut short (and left it odd)
+        self._header[1] |= 1
+        if configuration is not self._written:
+            data = json.dumps(configuration).encode('utf-8')
+            if len(data) > CONFIGURATION_SIZE:
+                raise ValueError(f"Configuration does not fit the snapshot ({len(data)} bytes)")
+            self._configuration[:len(data)] = np.frombuffer(data, dtype=np.uint8)
+            self._header[4] = len(data)
+            self._written = configuration
+        self._header[3] = step
+        self._header[2] = time.time_ns()
+        np.copyto(self._frame, pixels)
+        self._header[0] = VERSION
+        self._header[1] += 1
+        self._due = time.monotonic() + self.interval
+
+    def update(self, configuration, step, pixels):
+        """Save the render state when the interval has passed since it was saved last; called for every frame."""
+        if time.monotonic() >= self._due:
+            self.write(configuration, step, pixels)
+
+    def close(self):
+        # NOTE: the views into the map have to be released before it can be closed
+        del self._header
+        del self._configuration
+        del self._frame
+        self._map.close()
+
+
+def resume_step(state, configuration):
+    """
+    The step to resume the program of configuration at, from a state read from a snapshot,
+    or None when the program differs from the one that ran when the snapshot was written.
+    """
+    if not state or not configuration['on'] or not state['configuration'].get('on'):
+        return None
+    if state['configuration'].get('program') != configuration['program']:
+        return None
+    return state['step']
@@ -0,0 +1,78 @@
+"""
+ModLed SQL store - the registers in SQLite
+
+The registers of every unit are stored in a table of a SQLite database, through the
+SqlSlaveContext of pymodbus (and SQLAlchemy). Importing this module is relatively slow,
+so it is only imported once the store is opened.
+"""
+
+import logging
+
+from pymodbus.datastore.database import SqlSlaveContext
+
+import sqlalchemy
+from sqlalchemy import select, func
+
+from configuration import upgrade, LEGACY
+from datastore import TYPE_FUNCTIONS
+
+logger = logging.getLogger(__name__)
+
+
+class ModLedSqlSlaveContext(SqlSlaveContext):
+    def __init__(self, database='modled', table=None):
+        # NOTE: every unit has its own table, such that the units in one database don't share registers
+        table = table or database
+        database = f"sqlite:///{database}.sqlite3"
+        super(ModLedSqlSlaveContext, self).__init__(table=table, database=database)
+
+    def _db_create(self, table, database):
+        # NOTE: the same as SqlSlaveContext._db_create, except that the connection may be used
+        # from another thread than the one that created it; the CachedSlaveContext writes
+        # from its flush thread, while the context is created in the main thread.
+        self._engine = sqlalchemy.create_engine(database, echo=False, connect_args={'check_same_thread': False})
+        self._metadata = sqlalchemy.MetaData(self._engine)
+        self._table = sqlalchemy.Table(table, self._metadata,
+            sqlalchemy.Column('type', sqlalchemy.types.String(1)),
+            sqlalchemy.Column('index', sqlalchemy.types.Integer),
+            sqlalchemy.Column('value', sqlalchemy.types.Integer),
+            sqlalchemy.schema.UniqueConstraint('type', 'index', name='key')
+        )
+        self._table.create(checkfirst=True)
+        self._connection = self._engine.connect()
+
+    def initialize(self, hr, force=False):
+        # NOTE: this function is currently hardcoded to work with Holding Registers only
+        logger.info('Initializing SQLite database')
+        number_of_existing_holding_registers = self._count('h')
+        if number_of_existing_holding_registers == 0:
+            logger.info(f"Initializing {self.database} with {hr}.")
+            address = hr.address
+            values = hr.values
+            # NOTE: this is rather naive, but it works for now; we can improve later
+            self._set('h', address, values)
+        elif number_of_existing_holding_registers < len(hr.values):
+            # NOTE: the registers added in later versions are added to the databases of earlier versions
+            count = number_of_existing_holding_registers
+            upgrades = upgrade(self.registers('h'))
+            logger.info(f"Extending {self.database} with {len(hr.values) - count} registers.")
+            self._set('h', hr.address + count, hr.values[count:])
+            for address, value in upgrades.items():
+                logger.info(f"Upgrading register {address} from {LEGACY} to {value}.")
+                self.setValues(TYPE_FUNCTIONS['h'], address, [value])
+        else:
+            logger.info(f"{self.database} already contains {number_of_existing_holding_registers} register addresses.")
+
+    def sync(self):
+        # NOTE: every write is committed by the SqlSlaveContext right away; there's nothing left to sync
+        pass
+
+    def registers(self, type):
+        """Returns all registers of a type as a dictionary of address to value."""
+        query = select([self._table.c.index, self._table.c.value]).where(self._table.c.type == type)
+        # NOTE: the indexes in the database are one higher than the addresses used in get/setValues
+        return {index - 1: value for index, value in self._connection.execute(query)}
+
+    def _count(self, type):
+        count = select([func.count()]).select_from(self._table).where(self._table.c.type == type).scalar()
+        return count
@@ -0,0 +1,58 @@
+"""
+Startup profile - where the time goes between starting the server and the lights
+
+The server marks the end of every step of its startup (importing modules, reading
+the configuration, lighting the strip, opening the store, starting the Modbus server)
+in a StartupProfile. With --profile-startup, the steps are reported once the server
+is ready, together with the time the process took to get to the first step.
+"""
+
+import os
+import time
+
+
+def process_age():
+    """The seconds since this process was started, or None when that can't be determined (i.e. not on Linux)."""
+    try:
+        with open('/proc/self/stat') as f:
+            # NOTE: the command can contain spaces; the fields we need come after its closing parenthesis
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - int(fields[19]) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupProfile(object):
+    """The duration of the steps of the startup, in the order they were marked."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        # NOTE: the time spent before the profile was created, i.e. starting the interpreter
+        self.before = process_age()
+        self.steps = []
+        self.events = []
+        self._last = self.started
+
+    def mark(self, step):
+        """Mark the end of step; the step started when the step before it ended."""
+        now = time.perf_counter()
+        self.steps.append((step, now - self._last, now - self.started))
+        self._last = now
+
+    def event(self, name, at):
+        """Record something that happened alongside the steps (e.g. the first frame shown) at a time.perf_counter()."""
+        self.events.append((name, at - self.started))
+
+    def report(self):
+        """The steps and events as lines of text, with the duration of every step and the time since the start."""
+        lines = []
+        if self.before is not None:
+            lines.append(f"{'interpreter':<24} {self.before * 1000:8.1f} ms")
+        offset = self.before or 0.0
+        for step, duration, elapsed in self.steps:
+            lines.append(f"{step:<24} {duration * 1000:8.1f} ms  (at {(offset + elapsed) * 1000:8.1f} ms)")
+        for name, elapsed in sorted(self.events, key=lambda event: event[1]):
+            lines.append(f"{name:<24} {'':>8}     (at {(offset + elapsed) * 1000:8.1f} ms)")
+        return lines
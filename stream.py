@@ -0,0 +1,54 @@
+"""
+StreamBuffer - pixel data streamed over Modbus
+
+In the stream program, a block of holding registers maps directly onto the pixels
+of the strip. The pixels are packed as 24-bit RGB, big-endian, without padding, so
+two pixels take three registers: red0 green0 | blue0 red1 | green1 blue1. A strip
+of 240 pixels takes 360 registers, i.e. three FC16 writes of at most 123 registers.
+
+Writes go into a back buffer. A frame is latched (made visible) when a write covers
+the last register of the frame, or when the commit register is written, so a host
+can update parts of a frame and show them at once.
+"""
+
+import numpy as np
+
+STREAM_FPS = 60 # the rate at which committed frames are picked up
+
+
+def registers_for(pixels):
+    """The number of registers needed to stream a number of pixels."""
+    return (pixels * 3 + 1) // 2
+
+
+class StreamBuffer(object):
+
+    def __init__(self, num):
+        self._num = num
+        # NOTE: big-endian words, such that the bytes of the registers are the RGB bytes in order
+        self._registers = np.zeros(registers_for(num), dtype='>u2')
+
+        self.frame = np.zeros(num, dtype=np.uint32)
+        self.sequence = 0
+
+    def __len__(self):
+        """The number of registers in the stream block."""
+        return len(self._registers)
+
+    def write(self, offset, values):
+        """Write register values at an offset into the block. Returns whether the frame was latched."""
+        end = min(offset + len(values), len(self._registers))
+        if offset >= end:
+            return False
+        self._registers[offset:end] = values[:end - offset]
+        if end == len(self._registers):
+            self.commit()
+            return True
+        return False
+
+    def commit(self):
+        """Latch the back buffer into a new frame."""
+        data = self._registers.view(np.uint8)[:self._num * 3].reshape(self._num, 3).astype(np.uint32)
+        # NOTE: the frame is replaced, not updated in place, so readers always see a complete frame
+        self.frame = (data[:, 0] << 16) | (data[:, 1] << 8) | data[:, 2]
+        self.sequence += 1
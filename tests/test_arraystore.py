@@ -0,0 +1,100 @@
+import pytest
+
+from pymodbus.datastore import ModbusSequentialDataBlock
+
+import arraystore
+from arraystore import ModLedArraySlaveContext
+from datastore import read_registers
+
+
+@pytest.fixture(autouse=True)
+def directory(tmp_path, monkeypatch):
+    # NOTE: the stores are created relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_new_store_without_database():
+    store = ModLedArraySlaveContext('modled')
+    assert store.registers('h') == {}
+    assert arraystore.read_registers('modled') is None
+
+    store.initialize(hr=ModbusSequentialDataBlock(1, [3, 10, 20, 30]))
+    assert store.registers('h') == {0: 3, 1: 10, 2: 20, 3: 30}
+    assert arraystore.read_registers('modled') == {0: 3, 1: 10, 2: 20, 3: 30}
+
+
+def test_migrates_from_sqlite():
+    from sqlstore import ModLedSqlSlaveContext
+
+    sql = ModLedSqlSlaveContext('modled')
+    sql.initialize(hr=ModbusSequentialDataBlock(1, [3, 255, 128, 0, 60]))
+    sql.setValues(3, 2, [64])
+    registers = read_registers('modled')
+    assert registers == {0: 3, 1: 255, 2: 64, 3: 0, 4: 60}
+
+    store = ModLedArraySlaveContext('modled')
+    assert store.registers('h') == registers
+    assert store.getValues(3, 1, 3) == [255, 64, 0]
+
+    # NOTE: an existing store is not migrated again
+    sql.setValues(3, 2, [1])
+    assert ModLedArraySlaveContext('modled').getValues(3, 2) == [64]
+
+
+def test_initialize_extends_an_older_store():
+    store = ModLedArraySlaveContext('modled')
+    store.initialize(hr=ModbusSequentialDataBlock(1, [3, 10]))
+    store.setValues(3, 1, [99])
+    store.initialize(hr=ModbusSequentialDataBlock(1, [17, 17, 100, 255]))
+    assert store.registers('h') == {0: 3, 1: 99, 2: 100, 3: 255}
+
+
+def test_writes_persist():
+    store = ModLedArraySlaveContext('modled')
+    store.setValues(3, 0, [1, 2, 3])
+    store.setValues(4, 5, [6])
+    assert store.validate(3, 0, 3)
+    assert not store.validate(3, 0, 4)
+
+    reopened = ModLedArraySlaveContext('modled')
+    assert reopened.registers('h') == {0: 1, 1: 2, 2: 3}
+    assert reopened.registers('i') == {0: 0, 1: 0, 2: 0, 3: 0, 4: 0, 5: 6}
+
+
+def test_out_of_range():
+    store = ModLedArraySlaveContext('modled', size=8)
+    with pytest.raises(IndexError):
+        store.setValues(3, 7, [1, 2])
+
+
+def test_size_mismatch():
+    ModLedArraySlaveContext('modled', size=8)
+    with pytest.raises(ValueError):
+        ModLedArraySlaveContext('modled', size=16)
+
+
+class Map(object):
+    """Records the syncs of a memory map."""
+
+    def __init__(self, map, syncs):
+        self._map = map
+        self._syncs = syncs
+
+    def flush(self):
+        self._syncs.append(True)
+        self._map.flush()
+
+
+def test_writes_are_synced_with_sync(monkeypatch):
+    store = ModLedArraySlaveContext('modled')
+    store.initialize(hr=ModbusSequentialDataBlock(1, [3, 10]))
+    syncs = []
+    monkeypatch.setattr(store, '_map', Map(store._map, syncs))
+    store.setValues(3, 0, [5])
+    store.setValues(3, 1, [6])
+    assert syncs == []
+    store.sync()
+    assert syncs == [True]
+    # NOTE: written through the page cache, the registers can be read right away anyway
+    assert arraystore.read_registers('modled') == {0: 5, 1: 6}
@@ -0,0 +1,56 @@
+import pytest
+
+from client import parse_operation, read_operations, merge, MAX_READ, MAX_WRITE
+
+
+def test_parse_operation():
+    assert parse_operation('3') == ('read', 3, 1)
+    assert parse_operation('3-5') == ('read', 3, 3)
+    assert parse_operation('3=17') == ('write', 3, [17])
+    assert parse_operation('3=1,2,3') == ('write', 3, [1, 2, 3])
+
+
+def test_parse_invalid_operation():
+    with pytest.raises(ValueError):
+        parse_operation('5-3')
+    with pytest.raises(ValueError):
+        parse_operation('on')
+
+
+def test_read_operations():
+    assert read_operations(['0=3 1  # on', '# nothing', '2-3']) == [('write', 0, [3]), ('read', 1, 1), ('read', 2, 2)]
+
+
+def test_merge_contiguous_writes():
+    assert merge([('write', 1, [1]), ('write', 2, [2]), ('write', 3, [3, 4])]) == [('write', 1, [1, 2, 3, 4])]
+
+
+def test_merge_contiguous_reads():
+    assert merge([('read', 1, 1), ('read', 2, 3), ('read', 5, 1)]) == [('read', 1, 5)]
+
+
+def test_no_merge_of_overlapping_or_duplicate_reads():
+    operations = [('read', 1, 1), ('read', 1, 1), ('read', 0, 2), ('read', 1, 3)]
+    assert merge(operations) == operations
+
+
+def test_no_merge_of_gaps():
+    operations = [('read', 1, 1), ('read', 3, 1), ('write', 5, [1]), ('write', 7, [1])]
+    assert merge(operations) == operations
+
+
+def test_no_merge_of_writes_backwards():
+    operations = [('write', 2, [1]), ('write', 1, [1])]
+    assert merge(operations) == operations
+
+
+def test_merge_keeps_the_order():
+    operations = [('write', 1, [1]), ('read', 1, 1), ('write', 2, [2]), ('read', 2, 1)]
+    assert merge(operations) == operations
+
+
+def test_merge_limits():
+    reads = merge([('read', address, 1) for address in range(MAX_READ + 1)])
+    assert reads == [('read', 0, MAX_READ), ('read', MAX_READ, 1)]
+    writes = merge([('write', address, [address]) for address in range(MAX_WRITE + 1)])
+    assert writes == [('write', 0, list(range(MAX_WRITE))), ('write', MAX_WRITE, [MAX_WRITE])]
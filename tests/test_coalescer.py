@@ -0,0 +1,96 @@
+from coalescer import WriteCoalescer
+
+
+class Scheduler(object):
+    """A call_later that runs the scheduled calls when told to, instead of after their delay."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, delay, function):
+        call = Call(delay, function)
+        self.calls.append(call)
+        return call
+
+    def run(self):
+        calls, self.calls = self.calls, []
+        for call in calls:
+            if not call.cancelled:
+                call.function()
+
+
+class Call(object):
+
+    def __init__(self, delay, function):
+        self.delay = delay
+        self.function = function
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+def create(window=0.05):
+    applied = []
+    scheduler = Scheduler()
+    return WriteCoalescer(applied.append, window=window, call_later=scheduler), scheduler, applied
+
+
+def test_writes_within_the_window_are_applied_together():
+    coalescer, scheduler, applied = create()
+    coalescer.add(0, [3])
+    coalescer.add(4, (255, 0))
+    assert len(scheduler.calls) == 1
+    assert scheduler.calls[0].delay == 0.05
+    assert applied == []
+    assert coalescer.queued() == 2
+
+    scheduler.run()
+    assert applied == [[(0, [3]), (4, [255, 0])]]
+    assert coalescer.queued() == 0
+
+
+def test_window_starts_again_after_a_flush():
+    coalescer, scheduler, applied = create()
+    coalescer.add(0, [3])
+    scheduler.run()
+    coalescer.add(0, [0])
+    assert len(scheduler.calls) == 1
+    scheduler.run()
+    assert applied == [[(0, [3])], [(0, [0])]]
+
+
+def test_without_a_window_every_write_is_applied():
+    coalescer, scheduler, applied = create(window=0)
+    coalescer.add(0, [3])
+    coalescer.add(0, [0])
+    assert scheduler.calls == []
+    assert applied == [[(0, [3])], [(0, [0])]]
+
+
+def test_cancel_drops_the_pending_writes():
+    coalescer, scheduler, applied = create()
+    coalescer.add(0, [3])
+    coalescer.cancel()
+    assert scheduler.calls[0].cancelled
+    assert coalescer.queued() == 0
+
+    scheduler.run()
+    coalescer.flush()
+    assert applied == []
+
+    # NOTE: a write after the cancel schedules a flush of its own
+    coalescer.add(0, [0])
+    scheduler.run()
+    assert applied == [[(0, [0])]]
+
+
+def test_statistics():
+    coalescer, scheduler, applied = create()
+    assert coalescer.statistics() == {'writes': 0, 'batches': 0, 'merged': 0}
+    for value in range(3):
+        coalescer.add(1, [value])
+    scheduler.run()
+    coalescer.add(1, [3])
+    scheduler.run()
+    assert coalescer.statistics() == {'writes': 4, 'batches': 2, 'merged': 2}
@@ -0,0 +1,76 @@
+import pytest
+
+from pymodbus.datastore import ModbusSequentialDataBlock
+
+from configuration import (ModLedConfiguration, decode_program, upgrade, ADDRESS, COUNT, DEFAULTS,
+    ADDRESS_PROGRAM, ADDRESS_TRANSITION)
+from datastore import read_registers
+
+# NOTE: the block the first versions initialized a new database with
+BASELINE = [17] * 10
+
+
+def block():
+    """The block a new database is initialized with, like in server.create_store."""
+    return ModbusSequentialDataBlock(1, [DEFAULTS.get(address, 17) for address in range(ADDRESS, ADDRESS + COUNT)])
+
+
+@pytest.fixture(autouse=True)
+def directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.mark.parametrize('value, expected', [
+    (0, (False, 'fixed')),
+    (0b11, (True, 'fixed')),
+    (0b101, (True, 'rainbow')),
+    (0b1001, (True, 'strand_test')),
+    (0b10001, (True, 'stream')),
+    (0b10, (False, 'fixed')),
+    (1, (True, 'fixed'))
+])
+def test_decode_program(value, expected):
+    assert decode_program(value) == expected
+
+
+def test_new_database_starts_with_a_fixed_color():
+    configuration = ModLedConfiguration.fromRegisters(dict(enumerate(block().values)))
+    assert configuration.on
+    assert configuration.program == 'fixed'
+    assert configuration.transition == 0
+
+
+def test_upgrade():
+    assert upgrade(dict(enumerate(BASELINE))) == {ADDRESS_PROGRAM: DEFAULTS[ADDRESS_PROGRAM], ADDRESS_TRANSITION: 0}
+    # NOTE: registers that were written are left as they are, like the registers of a current database
+    assert upgrade(dict(enumerate([17, 5] + [17] * 7 + [500]))) == {}
+    assert upgrade({address: 17 for address in range(COUNT)}) == {}
+
+
+def test_baseline_database():
+    from sqlstore import ModLedSqlSlaveContext
+
+    ModLedSqlSlaveContext('modled').initialize(hr=ModbusSequentialDataBlock(1, BASELINE))
+
+    # NOTE: the configuration is decoded before the store is opened at startup
+    configuration = ModLedConfiguration.fromRegisters(read_registers('modled'))
+    assert (configuration.on, configuration.program, configuration.transition) == (True, 'fixed', 0)
+
+    ModLedSqlSlaveContext('modled').initialize(hr=block())
+    registers = read_registers('modled')
+    assert len(registers) == COUNT
+    assert registers[ADDRESS_PROGRAM] == DEFAULTS[ADDRESS_PROGRAM]
+    assert registers[ADDRESS_TRANSITION] == 0
+    assert ModLedConfiguration.fromRegisters(registers).program == 'fixed'
+
+
+def test_baseline_database_migrated_to_an_array_store():
+    from sqlstore import ModLedSqlSlaveContext
+    from arraystore import ModLedArraySlaveContext
+
+    ModLedSqlSlaveContext('modled').initialize(hr=ModbusSequentialDataBlock(1, BASELINE))
+    store = ModLedArraySlaveContext('modled')
+    store.initialize(hr=block())
+    assert store.getValues(3, ADDRESS_PROGRAM) == [DEFAULTS[ADDRESS_PROGRAM]]
+    assert ModLedConfiguration.fromStore(store).program == 'fixed'
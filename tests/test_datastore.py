@@ -0,0 +1,102 @@
+import pytest
+
+from datastore import CachedSlaveContext, TYPE_FUNCTIONS, _runs
+
+
+class RecordingStore(object):
+    """A store that records the writes to it."""
+
+    def __init__(self, holding=None):
+        self.holding = dict(holding or {})
+        self.writes = []
+        self.syncs = 0
+        self.fail = False
+
+    def registers(self, type):
+        return dict(self.holding) if type == 'h' else {}
+
+    def setValues(self, fx, address, values):
+        if self.fail:
+            raise IOError('store is down')
+        self.writes.append((fx, address, list(values)))
+
+    def sync(self):
+        self.syncs += 1
+
+
+@pytest.fixture
+def store():
+    return RecordingStore(dict.fromkeys(range(20), 0))
+
+
+def test_runs():
+    assert list(_runs({})) == []
+    assert list(_runs({5: 1, 3: 2, 4: 3, 9: 4, 10: 5, 12: 6})) == [(3, [2, 3, 1]), (9, [4, 5]), (12, [6])]
+
+
+def test_writes_are_cached_until_flushed(store):
+    context = CachedSlaveContext(store)
+    context.setValues(3, 2, [1, 2, 3])
+    assert context.getValues(3, 2, 3) == [1, 2, 3]
+    assert context.pending() == 3
+    assert store.writes == []
+
+    context.flush()
+    assert store.writes == [(TYPE_FUNCTIONS['h'], 2, [1, 2, 3])]
+    assert context.pending() == 0
+
+
+def test_flush_writes_runs_of_consecutive_addresses(store):
+    context = CachedSlaveContext(store)
+    context.setValues(3, 5, [1])
+    context.setValues(3, 1, [2, 3])
+    context.setValues(3, 3, [4])
+    context.setValues(3, 10, [5])
+    # NOTE: only the last value written to an address is flushed
+    context.setValues(3, 1, [6])
+    context.flush()
+    assert store.writes == [(3, 1, [6, 3, 4]), (3, 5, [1]), (3, 10, [5])]
+
+
+def test_flush_syncs_the_store_once_per_batch(store):
+    context = CachedSlaveContext(store)
+    context.flush()
+    assert store.syncs == 0
+    context.setValues(3, 1, [1])
+    context.setValues(3, 10, [2])
+    context.flush()
+    assert store.syncs == 1
+
+
+def test_volatile_registers_are_not_flushed(store):
+    context = CachedSlaveContext(store)
+    context.addVolatile('h', 256, 4)
+    assert context.validate(3, 256, 4)
+    assert not context.validate(3, 256, 5)
+    context.setValues(3, 256, [7, 8])
+    assert context.getValues(3, 256, 4) == [7, 8, 0, 0]
+    assert context.pending() == 0
+    context.flush()
+    assert store.writes == []
+
+
+def test_failed_flush_is_retried(store):
+    context = CachedSlaveContext(store)
+    context.setValues(3, 1, [1, 2])
+    store.fail = True
+    context.flush()
+    assert context.pending() == 2
+
+    # NOTE: a value written in the mean time wins over the one that failed
+    context.setValues(3, 2, [9])
+    store.fail = False
+    context.flush()
+    assert store.writes == [(3, 1, [1, 9])]
+
+
+def test_close_flushes(store):
+    context = CachedSlaveContext(store, flush_interval=60)
+    context.start()
+    context.setValues(3, 4, [1])
+    context.close()
+    assert store.writes == [(3, 4, [1])]
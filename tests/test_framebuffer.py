@@ -0,0 +1,67 @@
+import numpy as np
+
+from framebuffer import blend, correct, correction_table, pack, unpack
+
+
+def components(pixels):
+    pixels = np.asarray(pixels, dtype=np.uint32)
+    return np.stack([(pixels >> 24) & 0xff, *unpack(pixels)])
+
+
+def test_blend_ends():
+    outgoing = pack([255, 10, 0], [0, 20, 128], [0, 30, 255], [0, 40, 7])
+    incoming = pack([0, 200, 255], [255, 100, 64], [0, 50, 1], [255, 0, 9])
+    assert blend(outgoing, incoming, 0).tolist() == outgoing.tolist()
+    assert blend(outgoing, incoming, 256).tolist() == incoming.tolist()
+
+
+def test_blend_matches_the_components():
+    rng = np.random.default_rng(1)
+    outgoing = rng.integers(0, 1 << 32, 1000, dtype=np.uint64).astype(np.uint32)
+    incoming = rng.integers(0, 1 << 32, 1000, dtype=np.uint64).astype(np.uint32)
+    for weight in [1, 64, 128, 200, 255]:
+        expected = (components(outgoing) * (256 - weight) + components(incoming) * weight) >> 8
+        assert np.array_equal(components(blend(outgoing, incoming, weight)), expected)
+
+
+def test_blend_into_out():
+    out = np.zeros(2, dtype=np.uint32)
+    result = blend(pack([0, 0], 0, 0), pack([255, 128], 0, 0), 128, out=out)
+    assert result is out
+    assert unpack(out)[0].tolist() == [127, 64]
+
+
+def test_identity_correction():
+    table = correction_table()
+    pixels = np.arange(256, dtype=np.uint32) * 0x010101 | 0xab000000
+    assert correct(pixels, table).tolist() == pixels.tolist()
+
+
+def test_gamma_and_balance():
+    table = correction_table(gamma=220, red=255, green=200, blue=100)
+    rng = np.random.default_rng(2)
+    red, green, blue = (rng.integers(0, 256, 500) for _ in range(3))
+    corrected = correct(pack(red, green, blue, white=5), table)
+
+    def expected(values, level):
+        return np.round((values / 255) ** 2.2 * level).astype(np.uint32)
+
+    assert np.array_equal(unpack(corrected)[0], expected(red, 255))
+    assert np.array_equal(unpack(corrected)[1], expected(green, 200))
+    assert np.array_equal(unpack(corrected)[2], expected(blue, 100))
+    # NOTE: white is passed through as is
+    assert np.all(corrected >> 24 == 5)
+
+
+def test_zero_gamma_is_linear():
+    assert np.array_equal(correction_table(gamma=0), correction_table(gamma=100))
+
+
+def test_correct_into_out():
+    table = correction_table(red=0)
+    pixels = pack([255, 128], [1, 2], [3, 4])
+    out = np.empty(2, dtype=np.uint32)
+    assert correct(pixels, table, out=out) is out
+    assert out.tolist() == pack([0, 0], [1, 2], [3, 4]).tolist()
+    # NOTE: the pixels themselves are left as they are
+    assert unpack(pixels)[0].tolist() == [255, 128]
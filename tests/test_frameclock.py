@@ -0,0 +1,96 @@
+import pytest
+
+import frameclock
+from frameclock import FrameClock
+
+
+class Time(object):
+    """A clock that only advances by sleeping, or by the time spent on a frame."""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.now += delay
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    time = Time()
+    monkeypatch.setattr(frameclock, 'time', time)
+    return time
+
+
+def test_on_time(clock):
+    frames = FrameClock(fps=50)
+    for _ in range(10):
+        assert frames.tick() == 1
+        clock.now += 0.005
+    # NOTE: the time spent on a frame is taken from the sleep, so the frames are a period apart
+    assert clock.now == pytest.approx(100.0 + 10 * 0.02 + 0.005)
+    assert frames.missed == frames.dropped == 0
+    assert frames.frames == 10
+    assert frames.busy == pytest.approx(9 * 0.005)
+
+
+def test_skip(clock):
+    frames = FrameClock(fps=50)
+    frames.tick()
+    clock.now += 0.075 # overruns the next deadline by 55 ms
+    assert frames.tick() == 3
+    assert frames.missed == 1
+    assert frames.dropped == 2
+    # NOTE: back on the original schedule: the next deadline is the first one still ahead
+    assert frames.tick() == 1
+    assert clock.now == pytest.approx(100.0 + 5 * 0.02)
+    assert frames.busy_max == pytest.approx(0.075)
+
+
+def test_catch_up(clock):
+    frames = FrameClock(fps=50, skip=False)
+    frames.tick()
+    start = clock.now
+    clock.now += 0.075
+    # NOTE: the frames that are behind are shown without sleeping, until the clock has caught up
+    assert [frames.tick() for _ in range(3)] == [1, 1, 1]
+    assert clock.now == start + 0.075
+    assert frames.tick() == 1
+    assert clock.now == pytest.approx(start + 4 * 0.02)
+    assert frames.missed == 3
+    assert frames.dropped == 0
+
+
+def test_too_far_behind_to_catch_up(clock):
+    frames = FrameClock(fps=50, skip=False, max_catchup=5)
+    frames.tick()
+    clock.now += 0.2
+    assert frames.tick() == 1
+    assert frames.dropped == 9
+    # NOTE: the schedule starts over from the late frame
+    start = clock.now
+    assert frames.tick() == 1
+    assert clock.now == pytest.approx(start + 0.02)
+
+
+def test_start_restarts_the_schedule(clock):
+    frames = FrameClock(fps=50)
+    frames.tick()
+    clock.now += 1.0
+    frames.start(25)
+    assert frames.period == 0.04
+    assert frames.tick() == 1
+    assert frames.missed == 0
+
+
+def test_event_cuts_the_wait_short(clock):
+    import threading
+
+    event = threading.Event()
+    event.set()
+    frames = FrameClock(fps=50)
+    assert frames.tick(event) == 1
+    # NOTE: the event is waited for in real time, the fake clock did not advance
+    assert clock.now == 100.0
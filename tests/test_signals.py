@@ -0,0 +1,118 @@
+import gc
+
+from signals.signals import Signal, _make_id
+
+
+class Receiver(object):
+
+    def __init__(self):
+        self.received = []
+
+    def __call__(self, signal, sender, **kwargs):
+        self.received.append((sender, kwargs))
+        return len(self.received)
+
+
+class Sender(object):
+    pass
+
+
+def test_send_to_the_receivers_of_the_sender():
+    signal = Signal(use_snapshot=True)
+    first, second, anyone = Sender(), Sender(), Receiver()
+    receiver = Receiver()
+    signal.connect(receiver, sender=first)
+    signal.connect(anyone)
+
+    assert signal.send(first, address=1) == [(receiver, 1), (anyone, 1)]
+    assert signal.send(second, address=2) == [(anyone, 2)]
+    assert receiver.received == [(first, {'address': 1})]
+
+
+def test_connect_and_disconnect_rebuild_the_snapshot():
+    signal = Signal(use_snapshot=True)
+    sender = Sender()
+    receiver, other = Receiver(), Receiver()
+    signal.connect(receiver, sender=sender)
+    snapshot = signal._snapshot
+
+    signal.connect(other, sender=sender)
+    # NOTE: the snapshot is replaced, never changed, so a send() in progress keeps its receivers
+    assert signal._snapshot is not snapshot
+    assert len(snapshot[0][_make_id(sender)]) == 1
+    assert [r for r, _ in signal.send(sender)] == [receiver, other]
+
+    assert signal.disconnect(receiver, sender=sender)
+    assert [r for r, _ in signal.send(sender)] == [other]
+    assert not signal.disconnect(receiver, sender=sender)
+
+
+def test_connect_twice():
+    signal = Signal(use_snapshot=True)
+    receiver = Receiver()
+    signal.connect(receiver)
+    signal.connect(receiver)
+    assert len(signal.send(None)) == 1
+
+
+def test_garbage_collected_receivers_are_dropped():
+    signal = Signal(use_snapshot=True)
+    sender = Sender()
+    receiver, kept = Receiver(), Receiver()
+    signal.connect(receiver, sender=sender)
+    signal.connect(kept, sender=sender)
+
+    del receiver
+    gc.collect()
+    # NOTE: the snapshot is dropped when a receiver is collected, and rebuilt by the next send()
+    assert signal._snapshot is None
+    assert [r for r, _ in signal.send(sender)] == [kept]
+    assert signal._snapshot is not None
+    assert len(signal.receivers) == 1
+
+
+def test_weak_bound_method():
+    class Handler(object):
+        def handle(self, signal, sender, **kwargs):
+            return 'handled'
+
+    signal = Signal(use_snapshot=True)
+    handler = Handler()
+    signal.connect(handler.handle)
+    assert signal.send(None)[0][1] == 'handled'
+
+    del handler
+    gc.collect()
+    assert signal.send(None) == []
+
+
+def test_strong_receiver():
+    signal = Signal(use_snapshot=True)
+    signal.connect(Receiver(), weak=False)
+    gc.collect()
+    assert len(signal.send(None)) == 1
+
+
+def test_send_robust():
+    def failing(signal, sender, **kwargs):
+        raise RuntimeError('failed')
+
+    signal = Signal(use_snapshot=True)
+    receiver = Receiver()
+    signal.connect(failing)
+    signal.connect(receiver)
+    responses = signal.send_robust(None)
+    assert isinstance(responses[0][1], RuntimeError)
+    assert responses[1] == (receiver, 1)
+
+
+def test_same_receivers_without_snapshot():
+    senders = [Sender(), Sender()]
+    receivers = [Receiver(), Receiver()]
+    results = []
+    for use_snapshot in (False, True):
+        signal = Signal(use_snapshot=use_snapshot)
+        signal.connect(receivers[0], sender=senders[0])
+        signal.connect(receivers[1])
+        results.append([[r for r, _ in signal.send(sender)] for sender in senders + [None]])
+    assert results[0] == results[1]
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from snapshot import RenderSnapshot, resume_step, CONFIGURATION_SIZE
+
+CONFIGURATION = {'on': True, 'program': 'rainbow', 'number_of_leds': 4}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'modled.state')
+
+
+def test_empty_snapshot(path):
+    assert RenderSnapshot(path, 4).read() is None
+
+
+def test_write_and_read_after_a_restart(path):
+    snapshot = RenderSnapshot(path, 4)
+    snapshot.write(CONFIGURATION, 42, np.arange(4, dtype=np.uint32))
+    snapshot.close()
+
+    state = RenderSnapshot(path, 4).read()
+    assert state['configuration'] == CONFIGURATION
+    assert state['step'] == 42
+    assert state['frame'].tolist() == [0, 1, 2, 3]
+
+
+def test_torn_write_is_not_read(path):
+    snapshot = RenderSnapshot(path, 4)
+    snapshot.write(CONFIGURATION, 1, np.zeros(4, dtype=np.uint32))
+    # NOTE: the server stopped halfway the next write, leaving the sequence odd
+    snapshot._header[1] |= 1
+    snapshot._frame[:2] = 0xff
+    snapshot.close()
+
+    snapshot = RenderSnapshot(path, 4)
+    assert snapshot.read() is None
+
+    # NOTE: the next write makes the sequence even again, so it can be read
+    snapshot.write(CONFIGURATION, 2, np.full(4, 0x10, dtype=np.uint32))
+    assert snapshot._header[1] % 2 == 0
+    state = snapshot.read()
+    assert state['step'] == 2
+    assert state['frame'].tolist() == [0x10] * 4
+
+
+def test_sequence_increases_with_every_write(path):
+    snapshot = RenderSnapshot(path, 1)
+    sequences = []
+    for step in range(3):
+        snapshot.write(CONFIGURATION, step, np.zeros(1, dtype=np.uint32))
+        sequences.append(int(snapshot._header[1]))
+    assert sequences == [2, 4, 6]
+
+
+def test_other_length_starts_anew(path):
+    RenderSnapshot(path, 4).write(CONFIGURATION, 1, np.zeros(4, dtype=np.uint32))
+    assert RenderSnapshot(path, 8).read() is None
+
+
+def test_configuration_too_large(path):
+    snapshot = RenderSnapshot(path, 1)
+    with pytest.raises(ValueError):
+        snapshot.write({'name': 'x' * CONFIGURATION_SIZE}, 0, np.zeros(1, dtype=np.uint32))
+
+
+def test_update_waits_for_the_interval(path):
+    snapshot = RenderSnapshot(path, 1, interval=60)
+    snapshot.update(CONFIGURATION, 1, np.ones(1, dtype=np.uint32))
+    snapshot.update(CONFIGURATION, 2, np.ones(1, dtype=np.uint32))
+    assert snapshot.read()['step'] == 1
+
+
+def test_resume_step():
+    state = {'configuration': CONFIGURATION, 'step': 42}
+    assert resume_step(state, CONFIGURATION) == 42
+    assert resume_step(None, CONFIGURATION) is None
+    assert resume_step(state, dict(CONFIGURATION, on=False)) is None
+    assert resume_step(state, dict(CONFIGURATION, program='fixed')) is None
+    assert resume_step({'configuration': dict(CONFIGURATION, on=False), 'step': 42}, CONFIGURATION) is None
@@ -0,0 +1,62 @@
+import numpy as np
+
+from stream import StreamBuffer, registers_for
+
+
+def test_registers_for():
+    assert registers_for(1) == 2
+    assert registers_for(2) == 3
+    assert registers_for(240) == 360
+
+
+def test_two_pixels_in_three_registers():
+    stream = StreamBuffer(2)
+    assert len(stream) == 3
+    # NOTE: red0 green0 | blue0 red1 | green1 blue1
+    assert stream.write(0, [0x1122, 0x3344, 0x5566])
+    assert stream.frame.tolist() == [0x112233, 0x445566]
+
+
+def test_odd_number_of_pixels():
+    stream = StreamBuffer(3)
+    assert len(stream) == 5
+    stream.write(0, [0x0102, 0x0304, 0x0506, 0x0708, 0x09ff])
+    # NOTE: the low byte of the last register is padding
+    assert stream.frame.tolist() == [0x010203, 0x040506, 0x070809]
+
+
+def test_frame_latches_on_last_register():
+    stream = StreamBuffer(4)
+    assert not stream.write(0, [0xffff, 0xffff])
+    assert stream.sequence == 0
+    assert stream.frame.tolist() == [0, 0, 0, 0]
+
+    assert stream.write(2, [0xffff] * 4)
+    assert stream.sequence == 1
+    assert stream.frame.tolist() == [0xffffff] * 4
+
+
+def test_commit_latches_a_partial_write():
+    stream = StreamBuffer(4)
+    stream.write(0, [0xff00, 0x0000])
+    stream.commit()
+    assert stream.sequence == 1
+    assert stream.frame.tolist() == [0xff0000, 0, 0, 0]
+
+
+def test_commit_replaces_the_frame():
+    stream = StreamBuffer(2)
+    stream.write(0, [0x0102, 0x0304, 0x0506])
+    frame = stream.frame
+    stream.write(0, [0, 0, 0])
+    # NOTE: readers holding the previous frame keep seeing a complete frame
+    assert frame.tolist() == [0x010203, 0x040506]
+    assert stream.frame.tolist() == [0, 0]
+
+
+def test_writes_beyond_the_block_are_ignored():
+    stream = StreamBuffer(2)
+    assert not stream.write(3, [0xffff])
+    assert stream.write(2, [0x5566, 0xffff])
+    assert stream.frame.tolist() == [0, 0x005566]
+    assert np.all(stream.frame <= 0xffffff)
@@ -0,0 +1,93 @@
+from tracing import LatencyTracer, RollingHistogram, STAGES
+
+
+def trace(tracer, stages=STAGES[2:]):
+    tracer.begin()
+    for stage in stages:
+        tracer.mark(stage)
+
+
+def test_rolling_histogram():
+    histogram = RollingHistogram(size=3)
+    assert histogram.summary()['p50_ms'] is None
+    for latency in [1.0, 0.001, 0.002, 0.003]:
+        histogram.add(latency)
+    # NOTE: the oldest latency has rolled out of the window, but it's still counted
+    summary = histogram.summary()
+    assert summary['count'] == 4
+    assert summary['max_ms'] == 3.0
+
+
+def test_trace_is_completed_when_shown():
+    tracer = LatencyTracer()
+    trace(tracer)
+    assert tracer.pending() == 1
+    tracer.shown()
+    assert tracer.pending() == 0
+    for stage in STAGES[1:] + ['total']:
+        assert tracer.histograms[stage].count == 1
+
+
+def test_frames_before_the_switch_complete_nothing():
+    tracer = LatencyTracer()
+    trace(tracer, ['apply', 'notify'])
+    tracer.shown()
+    assert tracer.pending() == 1
+    assert tracer.histograms['total'].count == 0
+
+
+def test_stages_are_marked_in_order():
+    tracer = LatencyTracer()
+    tracer.begin()
+    # NOTE: a trace that wasn't applied yet, is not switched to
+    tracer.mark('switch')
+    tracer.shown()
+    assert tracer.pending() == 1
+
+
+def test_discard():
+    tracer = LatencyTracer()
+    trace(tracer, ['apply'])
+    tracer.begin()
+    tracer.discard()
+    # NOTE: the write that arrived after the apply is still in flight
+    assert tracer.pending() == 1
+
+
+def test_skipped():
+    tracer = LatencyTracer()
+    trace(tracer)
+    tracer.begin()
+    tracer.skipped()
+    assert tracer.pending() == 1
+    tracer.shown()
+    assert tracer.histograms['total'].count == 0
+
+
+def test_switch_while_off_is_not_left_in_flight():
+    import server
+    from configuration import ModLedConfiguration, DEFAULTS, COUNT, ADDRESS_PROGRAM
+    from stream import StreamBuffer
+
+    registers = {address: DEFAULTS.get(address, 17) for address in range(COUNT)}
+    registers[ADDRESS_PROGRAM] = 0 # off
+    configuration = ModLedConfiguration.fromRegisters(registers).asDict()
+    controller = server.ModLedController(configuration, StreamBuffer(configuration['number_of_leds']), disable_ledstrip=True)
+    tracer = LatencyTracer()
+    controller.setTracer(tracer)
+
+    # NOTE: a color written while the ledstrip is off
+    trace(tracer, ['apply', 'notify'])
+    controller.notify()
+    assert controller._next() == (None, None)
+    assert tracer.pending() == 0
+
+    # NOTE: and turning on again completes its own trace only
+    trace(tracer, ['apply', 'notify'])
+    controller.updateConfiguration(dict(configuration, on=True))
+    controller.notify()
+    frames, fps = controller._next()
+    next(frames)
+    controller._show()
+    assert tracer.pending() == 0
+    assert tracer.histograms['total'].count == 1
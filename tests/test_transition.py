@@ -0,0 +1,131 @@
+from framebuffer import Framebuffer
+from frameclock import FPS
+from transition import Crossfader
+
+
+class Program(object):
+    """A program that fills its framebuffer with a color: once, or for every step of an animation."""
+
+    def __init__(self, framebuffer, color, fps=None):
+        self.framebuffer = framebuffer
+        self.color = color
+        self.fps = fps
+        self.step = 0
+
+    def configure(self, configuration):
+        self.color = configuration['color']
+
+    def frames(self):
+        if not self.fps:
+            self.framebuffer.pixels[:] = self.color
+            yield
+            return
+        while True:
+            self.framebuffer.pixels[:] = self.color + self.step
+            self.step += 1
+            yield
+
+
+def program(color, fps=None):
+    return lambda framebuffer: Program(framebuffer, color, fps)
+
+
+def show(crossfader):
+    """The output of every frame the crossfader renders, until a static frame or a crossfade ends."""
+    frames, _ = crossfader.frames()
+    return [int(crossfader.output.pixels[0]) for _ in frames]
+
+
+def test_switch_without_transition():
+    output = Framebuffer(4)
+    crossfader = Crossfader(output)
+    crossfader.switch(program(0xff))
+    frames, fps = crossfader.frames()
+    assert fps is None
+    assert len(list(frames)) == 1
+    assert output.pixels.tolist() == [0xff] * 4
+
+    crossfader.switch(program(0x10))
+    assert show(crossfader) == [0x10]
+
+
+def test_crossfade_between_static_programs():
+    output = Framebuffer(2)
+    crossfader = Crossfader(output)
+    crossfader.switch(program(0xff))
+    show(crossfader)
+
+    crossfader.switch(program(0x00), duration=4 / FPS)
+    frames, fps = crossfader.frames()
+    assert fps == FPS
+    shown = []
+    for _ in frames:
+        shown.append(int(output.pixels[0]))
+    # NOTE: the outgoing color fades out in 4 frames, the last one being the incoming program
+    assert len(shown) == 4
+    assert shown == sorted(shown, reverse=True)
+    assert shown[-1] == 0x00
+    assert crossfader._outgoing is None
+
+
+def test_crossfade_runs_at_the_fps_of_the_faster_program():
+    crossfader = Crossfader(Framebuffer(1))
+    crossfader.switch(program(0, fps=25))
+    crossfader.switch(program(0, fps=100), duration=0.1)
+    _, fps = crossfader.frames()
+    assert fps == 100
+    assert len(list(crossfader.frames()[0])) == 10
+
+
+def test_switch_halfway_a_crossfade_fades_from_what_is_shown():
+    output = Framebuffer(1)
+    crossfader = Crossfader(output)
+    crossfader.switch(program(0xff))
+    show(crossfader)
+    crossfader.switch(program(0x00), duration=4 / FPS)
+    frames, _ = crossfader.frames()
+    next(frames)
+    next(frames)
+    halfway = int(output.pixels[0])
+
+    crossfader.switch(program(0x00), duration=2 / FPS)
+    shown = show(crossfader)
+    assert len(shown) == 2
+    assert halfway > shown[0] > shown[1] == 0x00
+
+
+def test_skip_moves_the_crossfade_and_the_programs_ahead():
+    output = Framebuffer(1)
+    crossfader = Crossfader(output)
+    crossfader.switch(program(0x00, fps=50))
+    next(crossfader.frames()[0])
+    crossfader.switch(program(0x100, fps=50), duration=10 / FPS)
+    frames, _ = crossfader.frames()
+    next(frames)
+    outgoing = crossfader._outgoing[2]
+    steps = (outgoing.step, crossfader.program.step)
+
+    crossfader.skip(5)
+    assert (outgoing.step, crossfader.program.step) == (steps[0] + 5, steps[1] + 5)
+    # NOTE: the crossfade ends 5 frames early, instead of stretching out
+    assert len(list(frames)) == 10 - 1 - 5
+
+
+def test_skip_without_animation():
+    crossfader = Crossfader(Framebuffer(1))
+    crossfader.skip(3)
+    crossfader.switch(program(0xff))
+    crossfader.skip(3)
+    assert crossfader.program.step == 0
+
+
+def test_retune_keeps_the_phase():
+    output = Framebuffer(1)
+    crossfader = Crossfader(output)
+    crossfader.switch(program(0x00, fps=50))
+    frames, _ = crossfader.frames()
+    next(frames)
+    next(frames)
+    crossfader.retune({'color': 0x100})
+    next(frames)
+    assert output.pixels.tolist() == [0x100 + 2]
@@ -0,0 +1,128 @@
+"""
+Latency tracing - where the time goes between a Modbus write and the light
+
+A write that changes what the ledstrip shows passes through these stages:
+
+ * execute: the request is executed by the Modbus server
+ * handler: the control_signal reaches the handler of the unit
+ * apply: the coalescer applies the write to the configuration
+ * notify: the controller is notified of the change
+ * switch: the controller switches programs, between two frames
+ * show: the first frame of the new program is shown
+
+Every write is traced from execute onwards. The time spent between a stage and
+the one before it is kept in a rolling histogram per stage, as is the total.
+Writes that don't change what's shown (e.g. writing the same color again) are
+dropped at apply, as are the writes that are switched to while the ledstrip stays
+off.
+"""
+
+import collections
+import threading
+import time
+
+import numpy as np
+
+STAGES = ['execute', 'handler', 'apply', 'notify', 'switch', 'show']
+SIZE = 1000 # the number of latencies kept per stage
+
+
+class RollingHistogram(object):
+    """The last size latencies (in seconds) of a stage."""
+
+    def __init__(self, size=SIZE):
+        self._samples = collections.deque(maxlen=size)
+        self.count = 0
+
+    def add(self, latency):
+        self._samples.append(latency)
+        self.count += 1
+
+    def summary(self):
+        """p50, p95 and max of the latencies in the window, in milliseconds."""
+        if not self._samples:
+            return {'count': self.count, 'p50_ms': None, 'p95_ms': None, 'max_ms': None}
+        samples = np.array(self._samples) * 1000
+        return {
+            'count': self.count,
+            'p50_ms': float(np.percentile(samples, 50)),
+            'p95_ms': float(np.percentile(samples, 95)),
+            'max_ms': float(samples.max())
+        }
+
+
+class LatencyTracer(object):
+    """
+    Traces the writes to a single unit. A trace is started for every write with begin()
+    and is then marked by every stage it passes. All traces that are in flight are marked
+    at once, because writes are merged into a single update along the way. A trace is
+    complete when the first frame after the switch is shown.
+    """
+
+    def __init__(self, size=SIZE):
+        self._lock = threading.Lock()
+        self._traces = []
+        self._switched = False
+
+        self.histograms = {stage: RollingHistogram(size) for stage in STAGES[1:]}
+        self.histograms['total'] = RollingHistogram(size)
+
+    def begin(self, received=None):
+        """Start a trace for a write that was executed at received (a time.perf_counter()) or now."""
+        now = time.perf_counter()
+        trace = {'execute': received or now, 'handler': now}
+        with self._lock:
+            self._traces.append(trace)
+        return trace
+
+    def mark(self, stage):
+        """Mark all traces in flight that reached the stage before as having reached stage."""
+        if not self._traces:
+            return
+        now = time.perf_counter()
+        previous = STAGES[STAGES.index(stage) - 1]
+        with self._lock:
+            for trace in self._traces:
+                if previous in trace:
+                    trace.setdefault(stage, now)
+            if stage == 'switch':
+                self._switched = True
+
+    def discard(self):
+        """Drop the traces in flight; the writes did not change what's shown."""
+        with self._lock:
+            self._traces = [trace for trace in self._traces if 'apply' not in trace]
+
+    def skipped(self):
+        """The switch did not lead to a frame (e.g. the ledstrip stays off); drops the traces that were switched to."""
+        if not self._switched:
+            return
+        with self._lock:
+            self._traces = [trace for trace in self._traces if 'switch' not in trace]
+            self._switched = False
+
+    def shown(self):
+        """A frame was shown; completes the traces that were switched to."""
+        # NOTE: this is called for every frame, so it should be cheap when there's nothing to complete
+        if not self._switched:
+            return
+        now = time.perf_counter()
+        with self._lock:
+            completed = [trace for trace in self._traces if 'switch' in trace]
+            self._traces = [trace for trace in self._traces if 'switch' not in trace]
+            self._switched = False
+        for trace in completed:
+            trace['show'] = now
+            previous = trace['execute']
+            for stage in STAGES[1:]:
+                if stage in trace:
+                    self.histograms[stage].add(trace[stage] - previous)
+                    previous = trace[stage]
+            self.histograms['total'].add(now - trace['execute'])
+
+    def pending(self):
+        """The number of traces in flight."""
+        return len(self._traces)
+
+    def summary(self):
+        return {stage: histogram.summary() for stage, histogram in self.histograms.items()}
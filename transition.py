@@ -0,0 +1,113 @@
+"""
+Transitions - crossfading between ledstrip programs
+
+Instead of cutting from one program to the next, the Crossfader renders the
+outgoing and the incoming program at the same time for the duration of the
+transition and blends their frames. Every program renders into a layer (a
+Framebuffer) of its own; the frames for the ledstrip are composed from the layers
+into the output framebuffer, a whole frame at a time.
+"""
+
+import numpy as np
+
+from frameclock import FPS
+from framebuffer import Framebuffer, blend
+
+
+class Crossfader(object):
+    """
+    Composes the frames of an output framebuffer from two layers: one for the program
+    that is shown and, during a transition, one for the program that is switched away
+    from. A program is given as a function that creates the program (see programs.py)
+    for the framebuffer it is given.
+    """
+
+    def __init__(self, output):
+        self.output = output
+        self._layers = [Framebuffer(len(output)), Framebuffer(len(output))]
+
+        self.program = None     # the program shown
+        self._layer = None      # the layer of the program shown
+        self._generator = None  # the frame generator of the program shown
+        self._outgoing = None   # (layer, generator, program) of the program switched away from
+        self._frames = 0        # the number of frames to crossfade in
+        self._frame = 0         # the frame of the crossfade shown last
+
+    def switch(self, create, duration=0.0):
+        """Switch to the program created by create, crossfading for duration seconds."""
+        if self._layer is not None and self._outgoing is None:
+            # NOTE: the outgoing program keeps running in its layer; the incoming one gets the other layer
+            outgoing = (self._layer, self._generator, self.program)
+            layer = self._layers[1] if self._layer is self._layers[0] else self._layers[0]
+        else:
+            # NOTE: nothing shown yet or halfway a transition; we crossfade from what's shown right now
+            frozen = self._layers[0] if self._layer is self._layers[1] else self._layers[1]
+            np.copyto(frozen.pixels, self.output.pixels)
+            outgoing = (frozen, None, None)
+            layer = self._layers[0] if frozen is self._layers[1] else self._layers[1]
+
+        self._layer = layer
+        self.program = create(layer)
+        self._generator = self.program.frames()
+
+        self._frames = int(round(duration * self._fps(outgoing)))
+        self._outgoing = outgoing if self._frames > 0 else None
+
+    def skip(self, count):
+        """
+        Move the animation ahead by count frames without rendering them, to make up for missed
+        deadlines: the crossfade and the programs in it step past the frames that were skipped.
+        """
+        if count <= 0:
+            return
+        if self._outgoing is not None:
+            self._frame += count
+            outgoing = self._outgoing[2]
+            if outgoing is not None and outgoing.fps:
+                outgoing.step += count
+        if self.program is not None and self.program.fps:
+            self.program.step += count
+
+    def retune(self, configuration):
+        """Retune the animation shown to a new configuration, keeping its phase."""
+        # NOTE: static programs are switched to again instead, such that the change can crossfade
+        if self.program is not None and self.program.fps:
+            self.program.configure(configuration)
+
+    def frames(self):
+        """
+        The frame generator and fps for the output: the crossfade right after a switch,
+        the program shown otherwise.
+        """
+        if self._outgoing is not None:
+            return self._crossfadeFrames(), self._fps(self._outgoing)
+
+        if self._generator is None:
+            # NOTE: a static frame is rendered again; animations don't end
+            self._generator = self.program.frames()
+        return self._programFrames(), self.program.fps
+
+    def _fps(self, outgoing):
+        """The fps of a crossfade: that of the faster program."""
+        fps = outgoing[2].fps if outgoing[2] is not None else None
+        return max(fps or 0, self.program.fps or 0) or FPS
+
+    def _crossfadeFrames(self):
+        outgoing, generator, _ = self._outgoing
+        # NOTE: skip() moves the frame of the crossfade ahead, past the frames that weren't rendered
+        self._frame = 0
+        while self._frame < self._frames:
+            self._frame += 1
+            # NOTE: a program that ends during the crossfade holds its last frame
+            if generator is not None:
+                next(generator, None)
+            next(self._generator, None)
+            blend(outgoing.pixels, self._layer.pixels, (self._frame << 8) // self._frames, out=self.output.pixels)
+            yield
+        self._outgoing = None
+
+    def _programFrames(self):
+        for _ in self._generator:
+            np.copyto(self.output.pixels, self._layer.pixels)
+            yield
+        self._generator = None